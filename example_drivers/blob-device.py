@@ -80,8 +80,10 @@ class BLOBDevice(device):
 
         
     @device.NewVectorProperty("img")
-    def new_img(self, device: str, name: str, values: list, names: list):
+    async def new_img(self, device: str, name: str, values: list, names: list):
         """Generate a new image after a fits or jpg switch property is clicked.
+        The image is made in the device's process pool so the event loop
+        keeps running.
 
         Parameters
         ----------
@@ -99,53 +101,49 @@ class BLOBDevice(device):
         self.IDSet(sw)
         if "fits" in names:
             self.IDMessage("Generating New FITS Image")
-            self.new_fits()
+            await self.new_fits(15)
+        elif not PIL:
+            self.IDMessage("To test JPG images please install PIL\
+                 https://pillow.readthedocs.io/en/stable/")
         else:
             self.IDMessage("Generating New JPG Image")
-            self.new_jpg()
+            await self.new_jpg(15)
 
         sw.state = "Ok"
         self.IDSet(sw)
 
 
-    def new_jpg(self) -> None:
-        """Generate a new JPG image on switch click and submit with
-        IDSetBLOB
+    @device.offload(vector="blob")
+    def new_jpg(nstars: int) -> dict:
+        """Generate a new JPG image in the process pool. The result is
+        put in the blob vector and sent with IDSetBLOB.
         """
-        if not PIL:
-            self.IDMessage("To test JPG images please install PIL\
-                 https://pillow.readthedocs.io/en/stable/")
-            return 
 
-        data = self.build_star_field(15, peak=254, sigma=2)
+        data = BLOBDevice.build_star_field(nstars, peak=254, sigma=2)
         jpg = Image.fromarray(data, mode="L")
-        jpg.save("img.jpg")
-        blob = self.IUFind("blob")
-        
-        with open("img.jpg", 'rb') as imgfd:
-            bd = imgfd.read()
-            blob["jpg_blob"] = bd
+        mem = BytesIO()
+        jpg.save(mem, format="jpeg")
 
-        self.IDSetBLOB(blob)
+        return {"jpg_blob": mem.getvalue()}
 
 
-    def new_fits(self) -> None:
-        """Generate a new fits on switch click and submit it with IDSetBLOB.
+    @device.offload(vector="blob")
+    def new_fits(nstars: int) -> dict:
+        """Generate a new fits in the process pool. The result is put in
+        the blob vector and sent with IDSetBLOB.
         """
 
-        blob = self.IUFind("blob")
-        data = self.build_star_field(15)
+        data = BLOBDevice.build_star_field(nstars)
 
         fitsdata = fits.PrimaryHDU(data=data)
         mem = BytesIO()
         fitsdata.writeto(mem)
-        mem.seek(0)
 
-        blob["fits_blob"] = mem.read()
-        self.IDSetBLOB(blob)
+        return {"fits_blob": mem.getvalue()}
 
 
-    def build_star_field(self, nstars: int, sigma :int=None, peak :int=None) -> np.array:
+    @staticmethod
+    def build_star_field(nstars: int, sigma :int=None, peak :int=None) -> np.array:
         """Use vectorized gauss to build a star field
 
         Parameters
@@ -170,7 +168,7 @@ class BLOBDevice(device):
             if sigma is None:
                 sigma = np.random.randint(1, 5)
                 peak = np.random.randint(1, 32)
-            star = self.gauss(xs, ys, peak, x0, y0, sigma)
+            star = BLOBDevice.gauss(xs, ys, peak, x0, y0, sigma)
             data = data + star
         
         return data.astype("int8")
@@ -216,4 +214,8 @@ async def main():
     BD = BLOBDevice()
     await BD.astart()
 
-asyncio.run(main())
\ No newline at end of file
+# The guard keeps the process pool workers
+# from starting the driver when they import
+# this module.
+if __name__ == "__main__":
+    asyncio.run(main())
\ No newline at end of file
@@ -61,7 +61,7 @@ class tester( INDIDevice.device ):
 
         switchvec = self.IUFind( name="svec", device="mydev" )
         switchvec.state = numvec.state
-        switchvec.sp[0].s = True
+        switchvec.sp[0].value = INDIDevice.ISState.ON
         blob = self.IUFind( name="blobvec", device="mydev" ).bp[0]
 
         try:
@@ -8,13 +8,30 @@ import datetime
 from enum import Enum
 from typing import Union, Callable
 import os
+import re
 import base64
+import zlib
 
 from abc import ABC
 from pathlib import Path
 import functools
 import traceback
 import inspect
+import collections
+import collections.abc
+import concurrent.futures
+import contextvars
+import threading
+import time
+
+from .scheduler import Scheduler
+
+try:
+    # Only needed by INumberArrayVector. Not imported as np
+    # which is the name of the INumberVector member list.
+    import numpy
+except ImportError:
+    numpy = None
 
 """
 The Base classes for the pyINDI device. Definitions
@@ -30,12 +47,19 @@ now = datetime.datetime.now()
 timestr = now.strftime("%H%M%S-%a")
 
 
-async def stdio(limit=asyncio.streams._DEFAULT_LIMIT):
+async def stdio(limit=asyncio.streams._DEFAULT_LIMIT,
+                high_water=None, low_water=None):
     """
     Collect the stdio as async streams. This is a shameless
     ctrl-c ctrl-v of this stackoverflow:
     https://stackoverflow.com/questions/52089869/how-to-\
             create-asyncio-stream-reader-writer-for-stdin-stdout
+
+    The writer is a non-blocking asyncio stream. Once more
+    than high_water bytes are buffered, because indiserver
+    is not reading, writer.drain() waits until the buffer
+    drops below low_water. The rest of the event loop keeps
+    running in the meantime.
     """
 
     loop = asyncio.get_running_loop()
@@ -50,12 +74,21 @@ async def stdio(limit=asyncio.streams._DEFAULT_LIMIT):
             lambda: asyncio.StreamReaderProtocol(reader),
             sys.stdin)
 
-#        writer_transport, writer_protocol = await loop.connect_write_pipe(
-#            lambda: asyncio.streams.FlowControlMixin(loop=loop),
-#            os.fdopen(sys.stdout.fileno(), 'wb'))
-#        writer = asyncio.streams.StreamWriter(
-#            writer_transport, writer_protocol, None, loop)
-        writer = sys.stdout
+        try:
+            writer_transport, writer_protocol = await loop.connect_write_pipe(
+                lambda: asyncio.streams.FlowControlMixin(loop=loop),
+                os.fdopen(sys.stdout.fileno(), 'wb', closefd=False))
+
+        except ValueError:
+            # stdout is a regular file, asyncio can only
+            # do pipes, sockets and character devices.
+            writer = WinIO(loop)
+
+        else:
+            writer_transport.set_write_buffer_limits(high_water, low_water)
+            writer = asyncio.streams.StreamWriter(
+                writer_transport, writer_protocol, None, loop)
+
     return reader, writer
 
 
@@ -78,27 +111,169 @@ def printa(msg: Union[str, bytes]):
 class WinIO:
     """Windows does not support asynchronous stdio
        operations. Instead, this object handles
-       those operations in a separate thread."""
+       those operations in a separate thread. It is
+       also the writer when stdout can not be an
+       asyncio pipe."""
 
     def __init__(self, loop):
         self.loop = loop
+        self._pending = []
+        self._size = 0
 
     async def readline(self):
         msg = await self.loop.run_in_executor(None, sys.stdin.readline)
         return msg.encode()
 
     async def read(self, nbytes):
+        # read1 returns whatever is available instead
+        # of blocking until all nbytes have arrived.
         msg = await self.loop.run_in_executor(
             None,
-            functools.partial(sys.stdin.read, nbytes))
-        return msg.encode()
+            functools.partial(sys.stdin.buffer.read1, nbytes))
+        return msg
 
-    async def write(self, msg):
-        print(msg)
+    def write(self, msg: bytes):
+        # Like StreamWriter.write this only buffers,
+        # drain does the blocking write.
+        self._pending.append(msg)
+        self._size += len(msg)
 
     async def drain(self):
-        # This does nothing
-        await asyncio.sleep(0)
+        while self._pending:
+            data = b"".join(self._pending)
+            self._pending.clear()
+            await self.loop.run_in_executor(None, self._write, data)
+            self._size -= len(data)
+
+    @staticmethod
+    def _write(data: bytes):
+        sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+
+    def get_write_buffer_size(self):
+        return self._size
+
+    def get_write_buffer_limits(self):
+        return (0, 0)
+
+
+# The start of a top level INDI element, where the parser
+# picks the stream up again after a syntax error.
+_element_start = re.compile(
+    rb"<(?:getProperties|enableBLOB|message|delProperty|pingRequest"
+    rb"|pingReply|(?:def|set|new)[A-Za-z]*Vector)[\s/>]")
+
+
+class XMLStreamParser:
+    """
+    Incremental parser for the stream of INDI xml
+    coming from indiserver. The INDI stream has no
+    root element so, like the XMLFeeder in utils.py,
+    we fake one. Data is fed in arbitrary chunks and
+    each complete top level element is returned
+    exactly once. Each byte is only parsed once.
+
+    A syntax error costs only the element it is in. The
+    elements completed before it are still returned and
+    parsing starts over at the next top level element,
+    the bytes up to it are dropped.
+    """
+
+    def __init__(self):
+        self.errors = 0
+        self.reset()
+
+    def reset(self):
+        self.parser = etree.XMLPullParser(
+            events=("start", "end"),
+            huge_tree=True)
+
+        # we need to fake a root element
+        self.parser.feed(b"<root>")
+        self.depth = 0
+        self.resync = False
+        self._partial = b""
+
+    def feed(self, data: bytes):
+        """
+        Feed a chunk of the stream to the parser and
+        return a list of the top level elements that
+        were completed by it.
+        """
+
+        completed = []
+        while data:
+            if self.resync:
+                data = self._skip_to_element(data)
+                if not data:
+                    break
+
+            inside = self.depth > 1
+            before = len(completed)
+            try:
+                self.parser.feed(data)
+
+            except etree.XMLSyntaxError as error:
+                self._read_events(completed)
+                self.errors += 1
+                logging.error(f"Could not parse xml {error}")
+
+                # The bad element is the first one not completed.
+                # If it started in an earlier chunk every element
+                # start in data comes after it.
+                skip = len(completed) - before
+                if not inside:
+                    skip += 1
+
+                starts = [m.start() for m in _element_start.finditer(data)]
+                self.reset()
+                if skip < len(starts):
+                    data = data[starts[skip]:]
+                else:
+                    # The next element starts in a later chunk.
+                    self.resync = True
+                    if starts:
+                        data = data[starts[-1] + 1:]
+
+                continue
+
+            self._read_events(completed)
+            break
+
+        return completed
+
+    def _read_events(self, completed: list):
+
+        for event, ele in self.parser.read_events():
+            if event == "start":
+                self.depth += 1
+                continue
+
+            self.depth -= 1
+            if self.depth == 1:
+                # Detach from the fake root so memory
+                # doesn't grow with the stream.
+                ele.getparent().remove(ele)
+                completed.append(ele)
+
+    def _skip_to_element(self, data: bytes):
+        """
+        Drop data up to the next top level element start,
+        return the rest.
+        """
+
+        data = self._partial + data
+        self._partial = b""
+        match = _element_start.search(data)
+        if match is None:
+            # Keep a tag start cut off at the end of the chunk.
+            cut = data.rfind(b"<", max(len(data) - 64, 0))
+            if cut >= 0:
+                self._partial = data[cut:]
+            return b""
+
+        self.resync = False
+        return data[match.start():]
 
 
 class INDIEnumMember(int):
@@ -123,13 +298,28 @@ class INDIEnumMember(int):
 
     def __eq__(self, other):
 
-        if isinstance(other, str):
+        # Members are singletons so the common cases
+        # are decided by type alone.
+        if self is other:
+            return True
+
+        cls = other.__class__
+        if cls is str:
+            return self.string == other
+
+        elif cls is self.__class__:
+            return False
+
+        elif isinstance(other, str):
             return self.string == other
 
         elif isinstance(other, Enum):
             return self.value == other.value
         return False
 
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
     def __repr__(self):
         return f"<{self.__name__}: {self.string}>"
 
@@ -169,6 +359,40 @@ class INDIEnum(INDIEnumMember, Enum):
     def __repr__(self):
         return f"<{self.__class__.__name__}: {self.string}>"
 
+    @classmethod
+    def lookup(cls, val):
+        """
+        Return the member val stands for. val may be a
+        member, its string or its int value.
+        """
+
+        if val.__class__ is cls:
+            return val
+
+        table = _enum_tables.get(cls)
+        if table is None:
+            table = _enum_tables[cls] = _enum_table(cls)
+
+        try:
+            return table[val]
+        except (KeyError, TypeError):
+            raise ValueError(f"{val} is not one of {list(cls)}") from None
+
+
+# Member lookup table of each INDIEnum keyed by
+# the member strings and int values.
+_enum_tables = {}
+
+
+def _enum_table(enum):
+
+    table = {}
+    for member in enum:
+        table[member.string] = member
+        table[member.value] = member
+
+    return table
+
 
 class IPState(INDIEnum):
     """
@@ -220,6 +444,167 @@ class ISState(INDIEnum):
         raise ValueError(f"ISState must be either Off or On not {string}")
 
 
+INDI_DTD = etree.DTD(
+    (Path(__file__).parent / "data/indi.dtd").open())
+
+# The xml attribute names of each element in the dtd keyed
+# by tag name. This is compiled once so serialization never
+# has to walk the dtd.
+INDI_SCHEMA = {
+    ele.name: tuple(attribute.name for attribute in ele.iterattributes())
+    for ele in INDI_DTD.iterelements()
+}
+
+
+def schema_attributes(tagname: str):
+    """
+    Return the attribute names of tagname from the
+    compiled schema or None if the dtd does not
+    define it.
+    """
+
+    return INDI_SCHEMA.get(tagname)
+
+
+def _missing_tag(tagname: str):
+    return AttributeError(f"{tagname} not defined in Document Type "
+                          "Definition")
+
+
+def xml_attributes(obj, names):
+    """
+    Map the xml attribute names to the str value of the
+    members of obj with the same name. Names that are
+    not members of obj are skipped.
+    """
+
+    attrib = {}
+    for attname in names:
+        try:
+            attrib[attname] = str(getattr(obj, attname))
+        except AttributeError:
+            pass
+
+    return attrib
+
+
+_attribute_escapes = str.maketrans({
+    "&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;",
+    "\n": "&#10;", "\r": "&#13;", "\t": "&#9;",
+})
+
+_text_escapes = str.maketrans({
+    "&": "&amp;", "<": "&lt;", ">": "&gt;", "\r": "&#13;",
+})
+
+
+def xml_open_tag(tagname: str, attrib: dict):
+    """
+    Return the escaped opening tag of tagname without the
+    closing bracket, the same way lxml writes it.
+    """
+
+    return f"<{tagname}" + "".join(
+        f' {name}="{value.translate(_attribute_escapes)}"'
+        for name, value in attrib.items())
+
+
+def xml_text(text: str):
+    """Escape element text the same way lxml does."""
+
+    return text.translate(_text_escapes)
+
+
+# Bytes of BLOB data base64 encoded at a time. A multiple
+# of 57 so the chunks break on the 76 character lines that
+# base64.encodebytes writes.
+BLOB_CHUNK_SIZE = 57 * 1024
+
+# Values of the enableBLOB element.
+BLOB_MODES = ("Never", "Also", "Only")
+
+# Modes of device.IDSet:
+#   all: always send every member.
+#   changed: send every member but skip the update if
+#            nothing changed since the last one.
+#   partial: send only the changed members, skip the
+#            update if nothing changed.
+SET_MODES = ("all", "changed", "partial")
+
+
+def _number_text(text):
+    return float(text.strip())
+
+
+def _stripped_text(text):
+    return str(text).strip()
+
+
+class IMemberList(list):
+    """
+    The list of IProperty members of a vector property.
+    It keeps a name to member map in sync as members
+    are added or removed so a vector can find its members
+    without scanning. Like a scan of the list, the first
+    member with a given name wins. The owner vector, if
+    set, is told about new members through its _adopt.
+    """
+
+    owner = None
+
+    def __init__(self, members=()):
+        super().__init__(members)
+        self._reindex()
+
+    def _reindex(self):
+        self.byname = {member.name: member for member in reversed(self)}
+        if self.owner is not None:
+            self.owner._adopt(self, True)
+
+    def append(self, member):
+        super().append(member)
+        self.byname.setdefault(member.name, member)
+        if self.owner is not None:
+            self.owner._adopt((member,))
+
+    def extend(self, members):
+        members = list(members)
+        super().extend(members)
+        for member in members:
+            self.byname.setdefault(member.name, member)
+        if self.owner is not None:
+            self.owner._adopt(members)
+
+    def __iadd__(self, members):
+        self.extend(members)
+        return self
+
+    def insert(self, index, member):
+        super().insert(index, member)
+        self._reindex()
+
+    def remove(self, member):
+        super().remove(member)
+        self._reindex()
+
+    def pop(self, index=-1):
+        member = super().pop(index)
+        self._reindex()
+        return member
+
+    def clear(self):
+        super().clear()
+        self._reindex()
+
+    def __setitem__(self, index, member):
+        super().__setitem__(index, member)
+        self._reindex()
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self._reindex()
+
+
 class IVectorProperty(ABC):
     """
     INDI Vector asbstractions
@@ -227,9 +612,24 @@ class IVectorProperty(ABC):
     TODO: Any member of any subclass of this class should
     be handled by setter and getter decorators.
 
+    Vectors and their members use __slots__ instead of a
+    per instance __dict__ so drivers can mirror large
+    amounts of controller state without the overhead.
     """
-    dtd = etree.DTD(
-        (Path(__file__).parent / "data/indi.dtd").open())
+    __slots__ = (
+        "device", "name", "label", "group", "_state", "state_changed",
+        "fast_serialize", "pretty_print", "max_rate", "set_mode", "iprops",
+        "lock",
+    )
+    dtd = INDI_DTD
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Compile the def and set attribute lists
+        # for this tagcontext once.
+        if "tagcontext" in cls.__dict__:
+            cls._def_attributes = schema_attributes("def" + cls.tagcontext)
+            cls._set_attributes = schema_attributes("set" + cls.tagcontext)
 
     def __init__(self,
                  device: str, name: str, state: IPState,
@@ -245,55 +645,106 @@ class IVectorProperty(ABC):
         self.group = group
 
         self._state = state
-
-        if hasattr(self, "np"):
-            self.iprops = self.np
-        elif hasattr(self, "tp"):
-            self.iprops = self.tp
-        elif hasattr(self, "lp"):
-            self.iprops = self.lp
-        elif hasattr(self, "sp"):
-            self.iprops = self.sp
-        elif hasattr(self, "bp"):
-            self.iprops = self.bp
+        self.state_changed = False
+
+        # Opt in to writing the set xml straight from
+        # strings instead of building lxml elements.
+        self.fast_serialize = False
+        self.pretty_print = True
+
+        # Most set messages per second device.IDSet sends
+        # for this vector, None for no limit.
+        self.max_rate = None
+
+        # Default mode of device.IDSet for this vector,
+        # one of SET_MODES.
+        self.set_mode = "all"
+
+        # Hold this while changing the vector or its members
+        # from another thread. The device holds it while it
+        # serializes the vector.
+        self.lock = threading.RLock()
+
+        for attr in ("np", "tp", "lp", "sp", "bp"):
+            if hasattr(self, attr):
+                members = getattr(self, attr)
+                if not isinstance(members, IMemberList):
+                    members = IMemberList(members)
+                    setattr(self, attr, members)
+
+                self.iprops = members
+                members.owner = self
+                self._adopt(members, True)
+                break
         else:
             raise AttributeError("Must have np, tp, lp, sp, bp attribute")
 
+    def _adopt(self, members, all_members=False):
+        """
+        Called with the members added to iprops, or with
+        all of them and all_members True after anything
+        else changed it.
+        """
+        pass
+
     @property
     def state(self):
         return self._state
 
     @state.setter
     def state(self, val):
-        if val not in list(IPState):
-            raise ValueError(f"{val} is not one of {list(IPState)}")
-        for st in IPState:
-            if st == val:
-                self._state = st
+        st = IPState.lookup(val)
+        if not st == self._state:
+            self.state_changed = True
+        self._state = st
+
+    @property
+    def changed(self):
+        """True if the state or any member changed since
+        the last clear_changed."""
+
+        return self.state_changed or any(
+            prop.changed for prop in self.iprops)
+
+    def changed_members(self):
+        return [prop for prop in self.iprops if prop.changed]
+
+    def clear_changed(self):
+        self.state_changed = False
+        for prop in self.iprops:
+            prop.changed = False
+
+    def mark_changed(self):
+        """
+        Flag the state and every member as changed, so the
+        next IDSet, in any mode, sends all of them again.
+        """
+
+        with self.lock:
+            self.state_changed = True
+            for prop in self.iprops:
+                prop.changed = True
 
-    def Def(self, msg=None):
+    def Def(self, msg=None, timestamp=None):
         """
         This will put together the defXXX xml element
-        for any vector property. It uses the dtd files
-        to map the xml attributes members of this class.
+        for any vector property. It uses the compiled dtd
+        schema to map the xml attributes members of this class.
+        timestamp is an optional ISO 8601 time string.
         """
 
         tagname = "def" + self.tagcontext
-        dtd_elements = {tag.name: tag for tag in self.dtd.iterelements()}
-        if tagname not in dtd_elements:
-            raise AttributeError(f"{tagname} not defined in Document Type "
-                                 "Definition")
+        if self._def_attributes is None:
+            raise _missing_tag(tagname)
 
-        ele_definition = dtd_elements[tagname]
-        ele = etree.Element(ele_definition.name)
-
-        for attribute in ele_definition.iterattributes():
-            if hasattr(self, attribute.name):
-                ele.set(attribute.name, str(getattr(self, attribute.name)))
+        ele = etree.Element(tagname, xml_attributes(self, self._def_attributes))
 
         for prop in self.iprops:
             ele.append(prop.Def())
 
+        if timestamp is not None:
+            ele.set("timestamp", timestamp)
+
         if msg is not None:
             ele.set("message", msg)
 
@@ -305,72 +756,132 @@ class IVectorProperty(ABC):
     def __repr__(self):
         return self.__str__()
 
-    def Set(self, msg=None):
+    def Set(self, msg=None, members=None, timestamp=None):
         """
         This will put together the setXXX xml element
-        for any vector property. It uses the dtd file(s)
-        to map xml attribute to members of this class.
+        for any vector property. It uses the compiled dtd
+        schema to map xml attribute to members of this class.
+        The protocol allows a set to carry only some of the
+        members, pass them as members to do that. timestamp
+        is an optional ISO 8601 time string.
         """
         tagname = "set" + self.tagcontext
-        dtd_elements = {tag.name: tag for tag in self.dtd.iterelements()}
-        if tagname not in dtd_elements:
-            raise AttributeError(f"{tagname} not defined in Document Type "
-                                 "Definition")
-
-        ele_definition = dtd_elements[tagname]
-        ele = etree.Element(ele_definition.name)
-        for attribute in ele_definition.iterattributes():
-            if hasattr(self, attribute.name):
-                ele.set(attribute.name, str(getattr(self, attribute.name)))
-        for prop in self.iprops:
-            logging.debug(prop)
+        if self._set_attributes is None:
+            raise _missing_tag(tagname)
+
+        if members is None:
+            members = self.iprops
+
+        ele = etree.Element(tagname, xml_attributes(self, self._set_attributes))
+        for prop in members:
             ele.append(prop.Set())
 
+        if timestamp is not None:
+            ele.set("timestamp", timestamp)
+
         if msg is not None:
             ele.set("message", msg)
 
         return ele
 
+    def SetString(self, msg=None, pretty_print=True, members=None,
+                  timestamp=None):
+        """
+        Build the setXXX xml as a string without lxml. The
+        output is the same as serializing the Set element
+        with etree.tostring except that pretty_print=False
+        drops all the whitespace between elements.
+        """
+
+        if members is None:
+            members = self.iprops
+
+        tagname = "set" + self.tagcontext
+        if self._set_attributes is None:
+            raise _missing_tag(tagname)
+
+        attrib = xml_attributes(self, self._set_attributes)
+        if timestamp is not None:
+            attrib["timestamp"] = timestamp
+        if msg is not None:
+            attrib["message"] = str(msg)
+
+        head = xml_open_tag(tagname, attrib)
+        members = [prop.SetString() for prop in members]
+
+        if pretty_print:
+            if not members:
+                return head + "/>\n"
+            body = "".join(f"  {member}\n" for member in members)
+            return f"{head}>\n{body}</{tagname}>\n"
+
+        if not members:
+            return head + "/>"
+        return f"{head}>{''.join(members)}</{tagname}>"
+
+    def SetBytes(self, msg=None, pretty_print=True, members=None,
+                 timestamp=None):
+        """
+        SetString encoded the way etree.tostring encodes,
+        non-ascii characters become character references.
+        """
+
+        return self.SetString(msg, pretty_print, members, timestamp).encode(
+            "ascii", "xmlcharrefreplace")
+
     @property
     def elements(self):
-        if isinstance(self, INumberVector):
-            return self.np
-        elif isinstance(self, ITextVector):
-            return self.tp
-        elif isinstance(self, ILightVector):
-            return self.lp
-        elif isinstance(self, ISwitchVector):
-            return self.sp
-        elif isinstance(self, IBLOBVector):
-            return self.bp
+        return self.iprops
 
     def __getitem__(self, name: str):
         """
         retrieve the IProperty
         """
-        for ele in self.elements:
-            if ele.name == name:
-                return ele
-
-        raise KeyError(f"{name} not in {self.__str__()}")
+        try:
+            return self.iprops.byname[name]
+        except KeyError:
+            raise KeyError(f"{name} not in {self.__str__()}") from None
 
     def __setitem__(self, name, val):
 
-        for ele in self.elements:
-            if ele.name == name:
-                ele.value = val
-                return
+        self[name].value = val
 
-        raise KeyError(f"{name} not in {self.__str__()}")
+    def update(self, values, state=None):
+        """
+        Assign many members at once, values maps member
+        names to values. Every name and value is checked
+        before any is assigned, so a bad one raises with
+        the vector unchanged. state optionally sets the
+        vector state too.
+        """
+
+        with self.lock:
+            checked = [
+                (name, self[name].validate(val))
+                for name, val in values.items()
+            ]
+            if state is not None:
+                state = IPState.lookup(state)
+
+            for name, val in checked:
+                self[name] = val
+
+            if state is not None:
+                self.state = state
 
     def __iter__(self):
-        for ele in self.elements:
-            yield ele
+        return iter(self.iprops)
 
 
 class IProperty:
-    dtd = etree.DTD(
-        (Path(__file__).parent / "data/indi.dtd").open())
+    __slots__ = ("name", "label", "changed")
+    dtd = INDI_DTD
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if "tagcontext" in cls.__dict__:
+            cls._def_attributes = schema_attributes("def" + cls.tagcontext)
+            cls._set_attributes = schema_attributes("one" + cls.tagcontext)
 
     def __init__(self, name: str, label: str = None):
 
@@ -380,6 +891,10 @@ class IProperty:
         self.label = label
         self.name = name
 
+        # Set when the value changes, cleared once
+        # the device has sent it to the clients.
+        self.changed = False
+
     def __str__(self):
         return f"<I{self.tagcontext} name={self.name} {self.value}>"
 
@@ -388,17 +903,10 @@ class IProperty:
 
     def Def(self):
         tagname = "def" + self.tagcontext
-        dtd_elements = {tag.name: tag for tag in self.dtd.iterelements()}
-
-        if tagname not in dtd_elements:
-            raise AttributeError(f"{tagname} not defined in Document Type "
-                                 "Definition")
+        if self._def_attributes is None:
+            raise _missing_tag(tagname)
 
-        ele_definition = dtd_elements[tagname]
-        ele = etree.Element(ele_definition.name)
-        for attribute in ele_definition.iterattributes():
-            if hasattr(self, attribute.name):
-                ele.set(attribute.name, str(getattr(self, attribute.name)))
+        ele = etree.Element(tagname, xml_attributes(self, self._def_attributes))
 
         # Blob definitions have empty data.
         if not isinstance(self, IBLOB):
@@ -408,22 +916,29 @@ class IProperty:
 
     def Set(self):
         tagname = "one" + self.tagcontext
-        dtd_elements = {tag.name: tag for tag in self.dtd.iterelements()}
+        if self._set_attributes is None:
+            raise _missing_tag(tagname)
 
-        if tagname not in dtd_elements:
-            raise AttributeError(f"{tagname} not defined in Document Type "
-                                 "Definition")
-
-        ele_definition = dtd_elements[tagname]
-        ele = etree.Element(ele_definition.name)
-        for attribute in ele_definition.iterattributes():
-            if hasattr(self, attribute.name):
-                ele.set(attribute.name, str(getattr(self, attribute.name)))
+        ele = etree.Element(tagname, xml_attributes(self, self._set_attributes))
 
         ele.text = str(self.value)
 
         return ele
 
+    def SetString(self):
+        """
+        Build the oneXXX xml as a string without lxml.
+        """
+
+        tagname = "one" + self.tagcontext
+        if self._set_attributes is None:
+            raise _missing_tag(tagname)
+
+        head = xml_open_tag(
+            tagname, xml_attributes(self, self._set_attributes))
+
+        return f"{head}>{xml_text(str(self.value))}</{tagname}>"
+
     @property
     def value(self):
         if isinstance(self, INumber):
@@ -460,6 +975,7 @@ class IProperty:
 
 
 class INumberVector(IVectorProperty):
+    __slots__ = ("perm", "np")
     tagcontext = "NumberVector"
 
     def __init__(self,
@@ -487,6 +1003,7 @@ class INumberVector(IVectorProperty):
 
 
 class INumber(IProperty):
+    __slots__ = ("format", "min", "max", "step", "_value")
     tagcontext = "Number"
     valuename = "value"
 
@@ -513,17 +1030,96 @@ class INumber(IProperty):
 
     @value.setter
     def value(self, val):
+        val = self.validate(val)
+        if val != self._value:
+            self._value = val
+            self.changed = True
+
+    def validate(self, val):
+        """Return val as a float or raise ValueError."""
+
         try:
-            self._value = float(val)
+            return float(val)
         except Exception:
             raise ValueError(f"""INumber value must be a number not {val}""")
 
 
-class ITextVector(IVectorProperty):
-    tagcontext = "TextVector"
+class INumberElement(INumber):
+    """
+    A member of an INumberArrayVector. The value and limits
+    live in the vector's arrays at index.
+    """
+
+    __slots__ = ("vector", "index")
+
+    def __init__(self, vector, index: int, name: str, format: str,
+                 label: str = None):
+
+        self.vector = vector
+        self.index = index
+        IProperty.__init__(self, name, label)
+        self.format = format
+
+    @property
+    def value(self):
+        return float(self.vector._values[self.index])
+
+    @value.setter
+    def value(self, val):
+        val = self.validate(val)
+        vector = self.vector
+        if val != vector._values[self.index]:
+            vector._values[self.index] = val
+            vector._changed[self.index] = True
+
+    @property
+    def changed(self):
+        return bool(self.vector._changed[self.index])
+
+    @changed.setter
+    def changed(self, val):
+        self.vector._changed[self.index] = val
+
+    @property
+    def min(self):
+        return float(self.vector.mins[self.index])
+
+    @min.setter
+    def min(self, val):
+        self.vector.mins[self.index] = val
+
+    @property
+    def max(self):
+        return float(self.vector.maxs[self.index])
+
+    @max.setter
+    def max(self, val):
+        self.vector.maxs[self.index] = val
+
+    @property
+    def step(self):
+        return float(self.vector.steps[self.index])
+
+    @step.setter
+    def step(self, val):
+        self.vector.steps[self.index] = val
+
+
+class INumberArrayVector(INumberVector):
+    """
+    An INumberVector whose values and limits are float64
+    numpy arrays, for wide vectors that are updated all at
+    once. The members are INumberElements so vp[name] still
+    works. Use update to assign many values at once, it
+    validates them against min and max in one go.
+
+    Needs numpy.
+    """
+
+    __slots__ = ("_values", "_changed", "mins", "maxs", "steps", "_heads")
 
     def __init__(self,
-                 tp: list,  # List of IText properties
+                 np: list,
                  device: str,
                  name: str,
                  state: IPState,
@@ -534,50 +1130,174 @@ class ITextVector(IVectorProperty):
                  group: str = None):
         """
          ## Arguments:
-         * np: List of INumber properties in the INumberVector
+         * np: List of INumber properties, their values are
+           copied into the arrays.
          * device: Name of indi device
          * name: Name of INumberVector
          * state: State
 
         """
 
-        self.perm = perm
-        self.tp = tp
-        super().__init__(device, name, state, label, group)
+        if numpy is None:
+            raise ImportError("INumberArrayVector needs numpy")
 
+        self._values = numpy.array([prop.value for prop in np], dtype=numpy.float64)
+        self._changed = numpy.zeros(len(np), dtype=bool)
+        self.mins = numpy.array([prop.min for prop in np], dtype=numpy.float64)
+        self.maxs = numpy.array([prop.max for prop in np], dtype=numpy.float64)
+        self.steps = numpy.array([prop.step for prop in np], dtype=numpy.float64)
 
-class IText(IProperty):
-    tagcontext = "Text"
-    valuename = "text"
+        elements = [
+            INumberElement(self, index, prop.name, prop.format, prop.label)
+            for index, prop in enumerate(np)
+        ]
 
-    def __init__(self,
-                 name: str,
-                 text: str,
-                 label: str = None):
+        # The oneNumber open tags never change.
+        self._heads = [
+            xml_open_tag("oneNumber", xml_attributes(prop, INumber._set_attributes))
+            for prop in elements
+        ]
 
-        super().__init__(name, label)
-        self.text = text
+        super().__init__(elements, device, name, state, perm,
+                         timeout, timestamp, label, group)
+
+        # SetString is the fast path here.
+        self.fast_serialize = True
 
     @property
-    def value(self):
-        return self.text
+    def values(self):
+        """Read only view of the values, use update to change them."""
+
+        values = self._values.view()
+        values.flags.writeable = False
+        return values
+
+    def update(self, values, state=None, clamp=True, snap=False):
+        """
+        Assign many values at once. values is either a
+        sequence with a value for every member or a mapping
+        of member name to value. Values outside min and max
+        (where min < max) are clamped, or raise ValueError
+        if clamp is False. With snap the values are rounded
+        to the nearest step above min. state optionally sets
+        the vector state too.
+        """
+
+        if state is not None:
+            state = IPState.lookup(state)
+
+        if isinstance(values, collections.abc.Mapping):
+            try:
+                index = [self.iprops.byname[name].index for name in values]
+            except KeyError as error:
+                raise KeyError(f"{error.args[0]} not in {self.__str__()}") from None
+
+            index = numpy.array(index, dtype=numpy.intp)
+            values = values.values()
+        else:
+            index = slice(None)
 
-    @value.setter
-    def value(self, val):
         try:
-            self.text = str(val)
-        except Exception:
-            raise ValueError(f"""IText value must be str not {val}""")
+            new = numpy.array(list(values), dtype=numpy.float64)
+        except (TypeError, ValueError):
+            raise ValueError(f"INumber values must be numbers not {values}")
+
+        if new.shape != self._values[index].shape:
+            raise ValueError(f"Expected {len(self._values[index])} values, "
+                             f"not {len(new)}")
+
+        mins = self.mins[index]
+        maxs = self.maxs[index]
+        limited = mins < maxs
+
+        if snap:
+            steps = self.steps[index]
+            stepped = limited & (steps > 0)
+            new = numpy.where(
+                stepped,
+                mins + numpy.round((new - mins) / numpy.where(stepped, steps, 1))
+                * steps,
+                new)
+
+        low = limited & (new < mins)
+        high = limited & (new > maxs)
+        if clamp:
+            new = numpy.where(low, mins, numpy.where(high, maxs, new))
+
+        elif low.any() or high.any():
+            names = [self.iprops[i].name for i in
+                     numpy.arange(len(self._values))[index][low | high]]
+            raise ValueError(f"{names} out of range in {self.__str__()}")
+
+        with self.lock:
+            self._changed[index] |= self._values[index] != new
+            self._values[index] = new
+            if state is not None:
+                self.state = state
 
+    @property
+    def changed(self):
+        return self.state_changed or bool(self._changed.any())
 
-class ILightVector(IVectorProperty):
-    tagcontext = "LightVector"
+    def changed_members(self):
+        return [self.iprops[i] for i in numpy.flatnonzero(self._changed)]
+
+    def clear_changed(self):
+        self.state_changed = False
+        self._changed[:] = False
+
+    def SetString(self, msg=None, pretty_print=True, members=None,
+                  timestamp=None):
+        """
+        IVectorProperty.SetString with the members formatted
+        straight from the arrays.
+        """
+
+        if members is None:
+            index = slice(None)
+            heads = self._heads
+        else:
+            index = numpy.array([prop.index for prop in members], dtype=numpy.intp)
+            heads = [self._heads[i] for i in index]
+
+        tagname = "set" + self.tagcontext
+        attrib = xml_attributes(self, self._set_attributes)
+        if timestamp is not None:
+            attrib["timestamp"] = timestamp
+        if msg is not None:
+            attrib["message"] = str(msg)
+
+        head = xml_open_tag(tagname, attrib)
+        texts = self._values[index].tolist()
+
+        if pretty_print:
+            if not heads:
+                return head + "/>\n"
+            body = "".join([
+                f"  {member}>{text}</oneNumber>\n"
+                for member, text in zip(heads, texts)
+            ])
+            return f"{head}>\n{body}</{tagname}>\n"
+
+        if not heads:
+            return head + "/>"
+        body = "".join([
+            f"{member}>{text}</oneNumber>"
+            for member, text in zip(heads, texts)
+        ])
+        return f"{head}>{body}</{tagname}>"
+
+
+class ITextVector(IVectorProperty):
+    __slots__ = ("perm", "tp")
+    tagcontext = "TextVector"
 
     def __init__(self,
-                 lp: list,  # List of IText properties
+                 tp: list,  # List of IText properties
                  device: str,
                  name: str,
                  state: IPState,
+                 perm: IPerm,
                  timeout: float = 0,
                  timestamp: datetime.datetime = None,
                  label: str = None,
@@ -591,11 +1311,79 @@ class ILightVector(IVectorProperty):
 
         """
 
-        self.lp = lp
+        self.perm = perm
+        self.tp = tp
+        super().__init__(device, name, state, label, group)
+
+
+class IText(IProperty):
+    __slots__ = ("_text",)
+    tagcontext = "Text"
+    valuename = "text"
+
+    def __init__(self,
+                 name: str,
+                 text: str,
+                 label: str = None):
+
+        super().__init__(name, label)
+        self._text = text
+
+    @property
+    def text(self):
+        return self._text
+
+    @text.setter
+    def text(self, val):
+        if val != self._text:
+            self._text = val
+            self.changed = True
+
+    @property
+    def value(self):
+        return self.text
+
+    @value.setter
+    def value(self, val):
+        self.text = self.validate(val)
+
+    def validate(self, val):
+        """Return val as a str or raise ValueError."""
+
+        try:
+            return str(val)
+        except Exception:
+            raise ValueError(f"""IText value must be str not {val}""")
+
+
+class ILightVector(IVectorProperty):
+    __slots__ = ("lp",)
+    tagcontext = "LightVector"
+
+    def __init__(self,
+                 lp: list,  # List of IText properties
+                 device: str,
+                 name: str,
+                 state: IPState,
+                 timeout: float = 0,
+                 timestamp: datetime.datetime = None,
+                 label: str = None,
+                 group: str = None):
+        """
+         ## Arguments:
+         * np: List of INumber properties in the INumberVector
+         * device: Name of indi device
+         * name: Name of INumberVector
+         * state: State
+
+        """
+
+        self.lp = lp
         super().__init__(device, name, state, label, group)
 
 
 class ILight(IProperty):
+    __slots__ = ("_state",)
     tagcontext = "Light"
     valuename = "state"
 
@@ -615,13 +1403,30 @@ class ILight(IProperty):
     @value.setter
     def value(self, val):
 
-        if val in list(IPState):
+        val = self.validate(val)
+        if not val == self._state:
             self._state = val
-        else:
-            raise ValueError(f"""ILight value must be in {list(IPState)}""")
+            self.changed = True
+
+    def validate(self, val):
+        """Return the IPState val stands for or raise ValueError."""
+
+        try:
+            return IPState.lookup(val)
+        except ValueError:
+            raise ValueError(f"""ILight value must be in {list(IPState)}""") from None
+
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, val):
+        self.value = val
 
 
 class ISwitchVector(IVectorProperty):
+    __slots__ = ("perm", "sp", "rule", "_on")
     tagcontext = "SwitchVector"
 
     def __init__(self,
@@ -648,34 +1453,50 @@ class ISwitchVector(IVectorProperty):
 
         self.sp = sp
         self.rule = rule
+
+        # The member switches that are on, the switches
+        # keep it up to date through their vector.
+        self._on = set()
         super().__init__(device, name, state, label, group)
 
+    def _adopt(self, members, all_members=False):
+
+        if all_members:
+            self._on = set()
+
+        for switch in members:
+            switch.vector = self
+            if ISState.ON == switch.value:
+                self._on.add(switch)
+
     def __setitem__(self, name, value):
 
-        if value not in list(ISState):
+        try:
+            value = ISState.lookup(value)
+        except ValueError:
             raise ValueError(
-                f"ISwitch value must be in 'On' or 'Off' not {value}")
+                f"ISwitch value must be in 'On' or 'Off' not {value}") from None
 
         # If its one of many we need to set the
         # other items.
-        if self.rule == "OneOfMany" and value == 'On':
-            exists = False
-            for sw in self.elements:
+        if self.rule == "OneOfMany" and value is ISState.ON:
+            switch = self.iprops.byname.get(name)
+            if switch is None:
+                raise KeyError(f"Switch {name} not in {self.name}.")
 
-                if sw.name == name:
-                    exists = True
-                    sw.value = 'On'
-                else:
+            # Only the switches in _on need turning off.
+            for sw in list(self._on):
+                if sw is not switch:
                     sw.value = 'Off'
 
-            if not exists:
-                raise KeyError(f"Switch {name} not in {self.name}.")
+            switch.value = 'On'
 
         else:
             super().__setitem__(name, value)
 
 
 class ISwitch(IProperty):
+    __slots__ = ("_state", "vector")
     tagcontext = "Switch"
     valuename = "state"
 
@@ -686,6 +1507,8 @@ class ISwitch(IProperty):
 
         super().__init__(name, label)
         self._state = state
+        # The ISwitchVector this switch is a member of.
+        self.vector = None
 
     @property
     def value(self):
@@ -694,13 +1517,24 @@ class ISwitch(IProperty):
     @value.setter
     def value(self, val):
 
-        val = str(val)
-
-        if val in list(ISState):
+        val = self.validate(val)
+        if not val == self._state:
             self._state = val
-        else:
+            self.changed = True
+            if self.vector is not None:
+                if val is ISState.ON:
+                    self.vector._on.add(self)
+                else:
+                    self.vector._on.discard(self)
+
+    def validate(self, val):
+        """Return the ISState val stands for or raise ValueError."""
+
+        try:
+            return ISState.lookup(val)
+        except ValueError:
             raise ValueError(
-                f"""ISwitch value must be either 'Off' or 'On' not {val}""")
+                f"""ISwitch value must be either 'Off' or 'On' not {val}""") from None
 
     @property
     def state(self):
@@ -708,6 +1542,7 @@ class ISwitch(IProperty):
 
 
 class IBLOBVector(IVectorProperty):
+    __slots__ = ("perm", "bp")
     tagcontext = "BLOBVector"
 
     def __init__(self,
@@ -733,8 +1568,57 @@ class IBLOBVector(IVectorProperty):
         self.bp = bp
         super().__init__(device, name, state, label, group)
 
+    def SetChunks(self, msg=None, chunk_size=BLOB_CHUNK_SIZE,
+                  compressed=None, members=None, timestamp=None):
+        """
+        Return a generator of the setBLOBVector xml as bytes,
+        see IBLOB.SetChunks. The attributes and data are
+        taken when this is called, not when the generator
+        is consumed. compressed maps member names to their
+        zlib compressed data. Pass members to send only some
+        of the BLOBs.
+        """
+
+        if compressed is None:
+            compressed = {}
+
+        if members is None:
+            members = self.iprops
+
+        tagname = "set" + self.tagcontext
+        if self._set_attributes is None:
+            raise _missing_tag(tagname)
+
+        with self.lock:
+            attrib = xml_attributes(self, self._set_attributes)
+            if timestamp is not None:
+                attrib["timestamp"] = timestamp
+            if msg is not None:
+                attrib["message"] = str(msg)
+
+            head = (xml_open_tag(tagname, attrib) + ">").encode(
+                "ascii", "xmlcharrefreplace")
+            tail = f"</{tagname}>".encode()
+            members = [
+                prop.SetChunks(chunk_size, compressed.get(prop.name))
+                for prop in members
+            ]
+            self.clear_changed()
+
+        def chunks():
+            yield head
+            for member in members:
+                yield from member
+            yield tail
+
+        return chunks()
+
 
 class IBLOB(IProperty):
+    __slots__ = (
+        "format", "_data", "size",
+        "compress_level", "compress_threshold",
+    )
     tagcontext = "BLOB"
     valuename = "data"
 
@@ -744,7 +1628,76 @@ class IBLOB(IProperty):
                  label: str = None):
         super().__init__(name, label)
         self.format = format
-        self.data = None
+        self._data = None
+
+        # zlib level to compress the data with before it is
+        # sent, None to send it as is. Data smaller than
+        # compress_threshold bytes is never compressed.
+        self.compress_level = None
+        self.compress_threshold = 4096
+
+    def should_compress(self):
+        return (
+            self.compress_level is not None
+            and self._data is not None
+            and len(self._data) >= self.compress_threshold
+            and not str(self.format).endswith(".z")
+        )
+
+    @property
+    def data(self):
+        return self._data
+
+    @data.setter
+    def data(self, val):
+        # Comparing the old bytes to the new could cost
+        # as much as sending them so any assignment counts.
+        self._data = val
+        self.changed = True
+        if val is not None:
+            self.size = len(val)
+
+    def SetChunks(self, chunk_size=BLOB_CHUNK_SIZE, compressed=None):
+        """
+        Return a generator of the oneBLOB xml as bytes. The
+        base64 text is encoded chunk_size bytes of data at
+        a time, so the whole encoded BLOB is never held in
+        memory. Joined, the chunks are the same as
+        etree.tostring(self.Set()).
+
+        compressed is the zlib compressed data. It is sent in
+        place of the data with ".z" added to the format, size
+        stays the uncompressed size as the protocol requires.
+        """
+
+        tagname = "one" + self.tagcontext
+        if self._set_attributes is None:
+            raise _missing_tag(tagname)
+
+        attrib = xml_attributes(self, self._set_attributes)
+
+        # Take the data now in case it is replaced
+        # before the chunks are written.
+        if compressed is None:
+            data = self.data
+        else:
+            data = compressed
+            attrib["format"] = f"{self.format}.z"
+
+        head = xml_open_tag(tagname, attrib)
+        head = (head + ">").encode("ascii", "xmlcharrefreplace")
+        tail = f"</{tagname}>".encode()
+
+        def chunks():
+            yield head
+            if data is not None:
+                view = memoryview(data).cast("B")
+                for start in range(0, len(view), chunk_size):
+                    yield base64.encodebytes(view[start:start + chunk_size])
+
+            yield tail
+
+        return chunks()
 
     @property
     def value(self) -> str:
@@ -771,11 +1724,633 @@ class IBLOB(IProperty):
 
     @value.setter
     def value(self, val: bytes):
+        self.data = self.validate(val)
+
+    def validate(self, val):
+        """Return val if it is bytes or raise ValueError."""
+
         if not isinstance(val, bytes):
             raise ValueError("""IBLOB value must by bytes type""")
 
-        self.size = len(val)
-        self.data = val
+        return val
+
+
+class OutputQueue:
+    """
+    A FIFO of output for device.toindiserver with the same
+    non-blocking methods as asyncio.Queue. Every item is
+    time stamped so we know how long output waits in the
+    queue. Queues can share a wakeup event so the writer
+    can wait on more than one of them.
+
+    Items put with kind "set" are droppable. Once maxsize
+    items are waiting the oldest set is dropped to make
+    room, anything else (defs, messages, ...) is always
+    queued. keys names the vectors an item sets. A set put
+    with replace supersedes the waiting replaceable set of
+    its vector: in place if nothing newer for that vector
+    is waiting, otherwise the old one is dropped and the
+    new one goes to the back, so no set is ever sent after
+    a newer one of the same vector. A set dropped to make
+    room calls its dropped callback, the device uses it to
+    flag the vector changed so its next set resends it.
+    """
+
+    def __init__(self, name: str, wakeup: asyncio.Event = None,
+                 maxsize: int = None):
+        self.name = name
+        self.maxsize = maxsize
+
+        # Entries are [enqueued, item, kind, keys, alive,
+        # dropped], dropped
+        # and coalesced entries are only marked dead and are
+        # thrown away when they reach the front.
+        self._items = collections.deque()
+        self._sets = collections.deque()
+        # The waiting replaceable set and the newest
+        # waiting entry of each vector.
+        self._keyed = {}
+        self._newest = {}
+        self._size = 0
+
+        if wakeup is None:
+            wakeup = asyncio.Event()
+        self.wakeup = wakeup
+
+        self.sent = 0
+        self.total_delay = 0.0
+        self.max_delay = 0.0
+        self.high_water = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def put_nowait(self, item, kind: str = None, keys=(), replace=False,
+                   dropped: Callable = None):
+
+        if replace:
+            key, = keys
+            entry = self._keyed.get(key)
+            if entry is not None:
+                self.coalesced += 1
+                if self._newest[key] is entry:
+                    entry[1] = item
+                    self.wakeup.set()
+                    return
+
+                self._remove(entry)
+
+        if self.maxsize is not None and self._size >= self.maxsize:
+            if not self._drop_oldest_set() and kind == "set":
+                self.dropped += 1
+                if dropped is not None:
+                    dropped()
+                return
+
+        if len(self._items) > 2 * self._size + 64:
+            # Mostly dead entries, a stalled writer never
+            # pops them so throw them away here.
+            self._items = collections.deque(
+                entry for entry in self._items if entry[4])
+
+        entry = [time.monotonic(), item, kind, keys, True, dropped]
+        self._items.append(entry)
+        self._size += 1
+        if kind == "set":
+            self._sets.append(entry)
+        for vector_key in keys:
+            self._newest[vector_key] = entry
+        if replace:
+            self._keyed[key] = entry
+
+        if self._size > self.high_water:
+            self.high_water = self._size
+
+        self.wakeup.set()
+
+    def _drop_oldest_set(self):
+
+        while self._sets:
+            entry = self._sets.popleft()
+            if entry[4]:
+                dropped = entry[5]
+                self._remove(entry)
+                self.dropped += 1
+                if dropped is not None:
+                    dropped()
+                return True
+
+        return False
+
+    def _remove(self, entry):
+
+        entry[4] = False
+        entry[1] = None
+        entry[5] = None
+        self._size -= 1
+        for key in entry[3]:
+            if self._keyed.get(key) is entry:
+                del self._keyed[key]
+            if self._newest.get(key) is entry:
+                del self._newest[key]
+
+    def get_nowait(self):
+
+        items = self._items
+        while items and not items[0][4]:
+            items.popleft()
+
+        if not items:
+            raise asyncio.QueueEmpty()
+
+        entry = items.popleft()
+        enqueued, item = entry[0], entry[1]
+        self._remove(entry)
+
+        sets = self._sets
+        while sets and not sets[0][4]:
+            sets.popleft()
+
+        delay = time.monotonic() - enqueued
+        self.sent += 1
+        self.total_delay += delay
+        if delay > self.max_delay:
+            self.max_delay = delay
+
+        return item
+
+    async def get(self):
+        while not self._size:
+            self.wakeup.clear()
+            await self.wakeup.wait()
+
+        return self.get_nowait()
+
+    def empty(self):
+        return not self._size
+
+    def qsize(self):
+        return self._size
+
+    def stats(self):
+        """Depth, drop counts and queueing delay in seconds."""
+
+        return {
+            "queued": self._size,
+            "maxsize": self.maxsize,
+            "high_water": self.high_water,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "sent": self.sent,
+            "mean_delay": self.total_delay / self.sent if self.sent else 0.0,
+            "max_delay": self.max_delay,
+        }
+
+    def __repr__(self):
+        return f"<OutputQueue {self.name} queued={self._size}>"
+
+
+class SetThrottle:
+    """
+    Book keeping for the IDSet calls of a vector with
+    max_rate set. While an update is scheduled further
+    calls only count as coalesced, the scheduled update
+    sends the latest state.
+    """
+
+    __slots__ = ("last", "handle", "msg", "mode", "sent", "coalesced")
+
+    def __init__(self):
+        self.last = float("-inf")
+        self.handle = None
+        self.msg = None
+        self.mode = "all"
+        self.sent = 0
+        self.coalesced = 0
+
+    def __repr__(self):
+        return f"<SetThrottle sent={self.sent} coalesced={self.coalesced}>"
+
+
+class PropertyRegistry:
+    """
+    The vector properties defined by a device, indexed
+    by (device, name) with a secondary index by group
+    so that lookups do not have to scan every property.
+    Iterating the registry yields the properties in the
+    order they were defined.
+    """
+
+    def __init__(self):
+        self._props = {}
+        self._groups = {}
+
+    def add(self, prop: IVectorProperty):
+        """
+        Register prop. A property with the same device
+        and name replaces the old one.
+        """
+
+        key = (prop.device, prop.name)
+        if key in self._props:
+            self.remove(self._props[key])
+
+        self._props[key] = prop
+        self._groups.setdefault(prop.group, {})[key] = prop
+
+    def remove(self, prop: IVectorProperty):
+        key = (prop.device, prop.name)
+        if self._props.get(key) is not prop:
+            raise KeyError(f"{prop} is not registered")
+
+        del self._props[key]
+        group = self._groups[prop.group]
+        del group[key]
+        if not group:
+            del self._groups[prop.group]
+
+    def find(self, name: str, device: str, group: str = None):
+        """
+        Return the property or None if it is not registered
+        (or is not in group when group is given).
+        """
+
+        prop = self._props.get((device, name))
+        if prop is not None and group is not None and prop.group != group:
+            return None
+
+        return prop
+
+    def group(self, group: str):
+        """Return a list of the properties in group."""
+
+        return list(self._groups.get(group, {}).values())
+
+    def groups(self):
+        return list(self._groups)
+
+    def __contains__(self, prop):
+        return self._props.get((prop.device, prop.name)) is prop
+
+    def __iter__(self):
+        return iter(list(self._props.values()))
+
+    def __len__(self):
+        return len(self._props)
+
+
+class OffloadedFunction:
+    """
+    Made by the device.offload decorator. Looked up on the
+    class it is the plain function, so the process pool can
+    pickle it by name. Looked up on a device it runs the
+    function in the device's process pool and returns the
+    task.
+    """
+
+    def __init__(self, func: Callable, vector: str = None):
+
+        functools.update_wrapper(self, func)
+        self.func = func
+        self.vector = vector
+
+    def __get__(self, instance, owner=None):
+
+        if instance is None:
+            return self.func
+
+        return functools.partial(instance._offload, self.func, self.vector)
+
+
+def iso_timestamp(when: datetime.datetime):
+    """
+    Format when as an INDI timestamp, ISO 8601 UT with
+    milliseconds and no offset. An aware when is converted
+    to UT, a naive one is taken to be UT already.
+    """
+
+    if when.tzinfo is not None:
+        when = when.astimezone(datetime.timezone.utc)
+
+    return when.strftime("%Y-%m-%dT%H:%M:%S.") + f"{when.microsecond // 1000:03d}"
+
+
+class TickClock:
+    """
+    UT wall clock timestamps for output. The time is formatted
+    once per event loop iteration and shared by everything
+    sent in that iteration, a batch of sets costs one
+    formatting call.
+    """
+
+    def __init__(self):
+
+        self._stamp = None
+        self.formatted = 0
+
+    def now(self):
+        """The ISO 8601 timestamp of this loop iteration."""
+
+        if self._stamp is not None:
+            return self._stamp
+
+        stamp = iso_timestamp(datetime.datetime.now(datetime.timezone.utc))
+        self.formatted += 1
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Not on the loop, nothing will expire it.
+            return stamp
+
+        self._stamp = stamp
+        loop.call_soon(self._expire)
+        return stamp
+
+    def _expire(self):
+        self._stamp = None
+
+
+class ProtocolTrace:
+    """
+    Ring buffer of the last size elements read from and
+    written to indiserver. Only one in sample of them is
+    kept. Incoming elements are kept as they are and only
+    serialized by dump, outgoing data is cut to max_bytes.
+    """
+
+    def __init__(self, size: int = 256, sample: int = 1, max_bytes: int = 4096):
+
+        self.records = collections.deque(maxlen=size)
+        self.sample = sample
+        self.max_bytes = max_bytes
+        self.seen = 0
+
+    def add(self, direction: str, data):
+
+        self.seen += 1
+        if self.seen % self.sample:
+            return
+
+        if isinstance(data, bytes) and len(data) > self.max_bytes:
+            data = data[:self.max_bytes] + b"..."
+
+        self.records.append((time.time(), direction, data))
+
+    def dump(self):
+        """The trace as text, oldest first."""
+
+        lines = []
+        for when, direction, data in self.records:
+            if not isinstance(data, bytes):
+                data = etree.tostring(data)
+
+            stamp = datetime.datetime.fromtimestamp(when).strftime("%H:%M:%S.%f")
+            lines.append(f"{stamp} {direction} {data.decode(errors='replace')}")
+
+        return "\n".join(lines)
+
+    def clear(self):
+        self.records.clear()
+
+
+def _mark_changed(vectors):
+
+    for vector in vectors:
+        vector.mark_changed()
+
+
+def _current_task():
+    """The running asyncio task, None outside of one."""
+
+    try:
+        return asyncio.current_task()
+    except RuntimeError:
+        return None
+
+
+class OutputBatch:
+    """
+    Made by device.batch. Holds the device's control output
+    in order while it is open. A set is held as the vector
+    and serialized when the batch closes. A batch only
+    collects the output of the task that opened it, other
+    tasks, and tasks it starts, send theirs as usual.
+    """
+
+    def __init__(self, dev):
+
+        self.dev = dev
+        self.items = []
+        self._sets = {}
+        self._token = None
+        self.task = None
+        self.open = False
+        self.deduped = 0
+
+    def add_set(self, vector, msg=None, mode="all"):
+
+        pending = self._sets.get(id(vector))
+        if pending is not None and (msg is None or pending[1] is None):
+            self.deduped += 1
+            if msg is not None:
+                pending[1] = msg
+            if mode != pending[2]:
+                pending[2] = "all"
+            return
+
+        pending = [vector, msg, mode]
+        self._sets[id(vector)] = pending
+        self.items.append(pending)
+
+    def __enter__(self):
+
+        batch = self.dev._open_batch()
+        if batch is not None:
+            return batch
+
+        self.task = _current_task()
+        self.open = True
+        self._token = self.dev._batch.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+
+        if not self.open:
+            return False
+
+        self.open = False
+        self.dev._batch.reset(self._token)
+        self._token = None
+        self.flush(sets=exc_type is None)
+
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+    def flush(self, sets=True):
+        """
+        Queue everything collected as one write. With sets
+        False the sets are left out.
+        """
+
+        output = []
+        keys = []
+        vectors = []
+        kind = "set"
+        for item in self.items:
+            if isinstance(item, bytes):
+                # Not only sets, the whole write must not be dropped.
+                kind = None
+                output.append(item)
+                continue
+
+            if not sets:
+                continue
+
+            vector, msg, mode = item
+            with vector.lock:
+                xml = self.dev._serialize_set(vector, msg, mode)
+
+            if xml is not None:
+                output.append(xml)
+                keys.append((vector.device, vector.name))
+                vectors.append(vector)
+
+        self.items = []
+        self._sets.clear()
+        if output:
+            # The keys keep a later set of one of these vectors
+            # from replacing an older one in front of this write.
+            self.dev.outq.put_nowait(
+                b"".join(output), kind, tuple(keys),
+                dropped=functools.partial(_mark_changed, vectors))
+
+
+class ThreadSafeDevice:
+    """
+    The device's output methods for use from other threads,
+    get it with device.threadsafe. Calls are queued under a
+    lock and run on the event loop in batches, one loop
+    wakeup per batch however many calls it holds. A batch
+    is run interval seconds after its first call. An IDSet
+    without a message of a vector that is already waiting
+    in the batch is dropped, the waiting one sends the
+    latest values anyway. Calls made before the device has
+    an event loop wait until it starts.
+
+    Hold vector.lock while changing a vector from the other
+    thread so it is not serialized half way through.
+
+    with vector.lock:
+        vector["TEMP"] = temp
+    dev.threadsafe.IDSet(vector)
+    """
+
+    def __init__(self, dev):
+
+        self.dev = dev
+        self._lock = threading.Lock()
+        self._calls = []
+        self._sets = set()
+        self.interval = 0.01
+        self.batches = 0
+        self.calls = 0
+        self.deduped = 0
+
+    def call(self, func: Callable, *args, **kwargs):
+        """Run func(*args, **kwargs) on the event loop."""
+
+        self._queue(func, args, kwargs)
+
+    def IDSet(self, vector, msg=None, mode=None):
+
+        if msg is None:
+            with self._lock:
+                if id(vector) in self._sets:
+                    self.deduped += 1
+                    return
+
+                self._sets.add(id(vector))
+                wake = not self._calls
+                self._calls.append((self.dev.IDSet, (vector, None, mode), {}))
+
+            if wake:
+                self._wake()
+
+            return
+
+        self._queue(self.dev.IDSet, (vector, msg, mode), {})
+
+    def IDSetBLOB(self, blob, msg=None, producer=None):
+
+        self._queue(self.dev.IDSetBLOB, (blob, msg, producer), {})
+
+    def IDMessage(self, msg, timestamp=None, msgtype="INFO"):
+
+        self._queue(self.dev.IDMessage, (msg, timestamp, msgtype), {})
+
+    def IDDef(self, prop, msg=None):
+
+        self._queue(self.dev.IDDef, (prop, msg), {})
+
+    def IDDelete(self, name=None, msg=None):
+
+        self._queue(self.dev.IDDelete, (name, msg), {})
+
+    def _queue(self, func, args, kwargs):
+
+        with self._lock:
+            wake = not self._calls
+            self._calls.append((func, args, kwargs))
+
+        if wake:
+            self._wake()
+
+    def start(self):
+        """Run the calls made before the loop existed."""
+
+        with self._lock:
+            waiting = bool(self._calls)
+
+        if waiting:
+            self._wake()
+
+    def _wake(self):
+
+        loop = self.dev.mainloop
+        if loop is None:
+            # Not started yet, start wakes us.
+            return
+
+        if self.interval > 0:
+            loop.call_soon_threadsafe(loop.call_later, self.interval, self._run)
+        else:
+            loop.call_soon_threadsafe(self._run)
+
+    def _run(self):
+
+        with self._lock:
+            calls = self._calls
+            self._calls = []
+            self._sets.clear()
+
+        if not calls:
+            # Woken by start and by the call itself.
+            return
+
+        self.batches += 1
+        self.calls += len(calls)
+        with self.dev.batch():
+            for func, args, kwargs in calls:
+                try:
+                    func(*args, **kwargs)
+                except Exception as error:
+                    logging.error(f"Thread safe call of {func.__name__} "
+                                  f"failed: {error}")
+                    logging.error(traceback.format_exc())
 
 
 class device(ABC):
@@ -793,16 +2368,40 @@ class device(ABC):
     hase CPU bound activities it is recommended that you
     use a multi processing paradigm.
 
-    Either way you should use the mainloop member
-    of this class to utilize concurrency. With IO
-    bound calls, use the many available futures/task
-    methods. With CPU bound you should use
-    self.mainloop.run_in_executor to run tasks
-    in a process pool.
-    """
+    Either way you should use the mainloop member
+    of this class to utilize concurrency. With IO
+    bound calls, use the many available futures/task
+    methods. With CPU bound you should use the
+    device.offload decorator to run them in the
+    device's process pool.
+    """
+
+    _registrants = []
+    _NewPropertyMethods = {}
+
+    def __init_subclass__(cls, **kwargs):
+        """
+        Give each subclass its own handler registries. They
+        start with the base class ones plus the methods the
+        NewVectorProperty and repeat decorators marked in
+        the class body.
+        """
+
+        super().__init_subclass__(**kwargs)
+
+        methods = dict(cls._NewPropertyMethods)
+        registrants = [reg for reg in cls._registrants
+                       if reg.__name__ not in cls.__dict__]
+
+        for attr in cls.__dict__.values():
+            for name in getattr(attr, "new_property_names", ()):
+                methods[name] = attr
+
+            if hasattr(attr, "repeat_millis"):
+                registrants.append(attr)
 
-    _registrants = []
-    _NewPropertyMethods = {}
+        cls._NewPropertyMethods = methods
+        cls._registrants = registrants
 
     def __init__(self, loop=None, config=None, name=None):
 
@@ -813,7 +2412,7 @@ class device(ABC):
         name: Name of the device defaulting to name of the class
         """
 
-        self.props = []
+        self.props = PropertyRegistry()
         self.config = config
         self.timer_queue = asyncio.Queue()
 
@@ -822,12 +2421,91 @@ class device(ABC):
         else:
             self._devname = name
 
-        self.outq = asyncio.Queue()
-        self.handles = []
-
+        # Output goes out in two lanes. BLOBs go in the bulk
+        # lane and everything else in the control lane, which
+        # is always written first.
+        self._output_ready = asyncio.Event()
+        # When stdout stalls the lanes drop their oldest
+        # sets past maxsize, see OutputQueue.
+        self.outq = OutputQueue("control", self._output_ready, maxsize=10000)
+        self.bulkq = OutputQueue("bulk", self._output_ready, maxsize=64)
         self._once = True
 
-        self.repeat_q = asyncio.Queue()
+        # Timers, including the repeat decorated methods.
+        # handles holds the TimerHandle of each repeat job.
+        self.scheduler = Scheduler(loop)
+        self.handles = []
+
+        # SetThrottle of each rate limited vector
+        # keyed by (device, name).
+        self.throttles = {}
+
+        # The enableBLOB mode of each BLOB vector keyed by
+        # (device, name), name is None for the whole device.
+        # Without an enableBLOB BLOBs are always sent.
+        self.blob_modes = {}
+        self.default_blob_mode = "Also"
+        self.skipped_blobs = 0
+
+        # The last IDSetBLOB task of each BLOB vector keyed
+        # by (device, name). The next one waits for it so
+        # BLOBs are queued in the order they were set.
+        self._blob_tails = {}
+
+        # Coroutine ISNew handlers run as tasks. Handlers of
+        # one property run one at a time, in order, and at
+        # most max_handlers run at once. Once max_pending
+        # handlers are running or waiting to, the reader
+        # waits before it reads more.
+        self.max_handlers = 16
+        self.max_pending = 256
+        self._handler_slots = None
+        self._pending_slots = None
+        self._handler_tails = {}
+        self.handler_tasks = set()
+
+        # Process pool of the offload decorated functions,
+        # made when first needed. At most max_offload calls
+        # are in flight, the rest wait their turn.
+        self.offload_workers = None
+        self.max_offload = os.cpu_count() or 1
+        self.offload_tasks = set()
+        self._offload_pool = None
+        self._offload_slots = None
+
+        self._threadsafe = None
+
+        # The OutputBatch collecting control output, if any.
+        # A context variable so a batch opened by one task
+        # does not collect the output of the others.
+        self._batch = contextvars.ContextVar("batch", default=None)
+
+        # ProtocolTrace, see enable_trace.
+        self.trace = None
+
+        # Messages always carry a timestamp, set, def and
+        # delProperty elements only if timestamp_output is
+        # set. They all come from the same cached clock.
+        self.clock = TickClock()
+        self.timestamp_output = False
+
+        # Number of bytes to read from stdin at a time
+        self.read_width = 65536
+
+        # Most bytes toindiserver joins into one write
+        self.max_batch_bytes = 65536
+
+        # Flow control of the stdout transport. toindiserver
+        # waits when more than write_high_water bytes are
+        # buffered and resumes below write_low_water.
+        self.write_high_water = 262144
+        self.write_low_water = 65536
+        self.write_stats = {
+            "writes": 0,
+            "bytes": 0,
+            "waits": 0,
+            "max_buffered": 0,
+        }
 
         self.mainloop = loop
 
@@ -845,13 +2523,11 @@ class device(ABC):
         if self.mainloop is None:
             self.mainloop = asyncio.new_event_loop()
             asyncio.set_event_loop(self.mainloop)
-        self.reader, self.writer = self.mainloop.run_until_complete(stdio())
+        self.reader, self.writer = self.mainloop.run_until_complete(
+            stdio(high_water=self.write_high_water,
+                  low_water=self.write_low_water))
         self.running = True
-        future = asyncio.gather(
-            self.run(),
-            self.toindiserver(),
-            self.repeat_queuer()
-        )
+        future = asyncio.gather(*self.tasks())
 
         self.mainloop.run_until_complete(future)
 
@@ -865,31 +2541,29 @@ class device(ABC):
 
         if self.mainloop is None:
             self.mainloop = asyncio.get_event_loop()
-        self.reader, self.writer = await stdio()
+        self.reader, self.writer = await stdio(
+            high_water=self.write_high_water,
+            low_water=self.write_low_water)
         self.running = True
-        future = asyncio.gather(
-            self.run(),
-            self.toindiserver(),
-            self.repeat_queuer(),
-            *tasks
-        )
+        future = asyncio.gather(*self.tasks(), *tasks)
 
         await future
 
-    async def repeat_queuer(self):
-        while self.running:
-            func = await self.repeat_q.get()
-            try:
-                if inspect.iscoroutinefunction(func):
-                    await func(self)
-                else:
-                    func(self)
+    def tasks(self):
+        """The coroutines start and astart run."""
 
-            except Exception as error:
-                sys.stderr.write("There was an exception in the later "
-                                 f"decorated fxn {func}:\n{error}\nSee "
-                                 "traceback below.")
-                traceback.print_exc(file=sys.stderr)
+        self._attach_loop()
+        return [
+            self.run(),
+            self.toindiserver(),
+        ]
+
+    def _attach_loop(self):
+        """Hand mainloop to the parts that were waiting for it."""
+
+        self.scheduler.loop = self.mainloop
+        if self._threadsafe is not None:
+            self._threadsafe.start()
 
     def exception(self, loop, context):
 
@@ -914,129 +2588,343 @@ class device(ABC):
         return f"<{self.name()}>"
 
     async def toindiserver(self):
+        """
+        Write the queued xml to indiserver.
+
+        The control lane, outq, holds bytes and always goes
+        first. Everything waiting in it when the writer wakes
+        up is joined and sent with a single write of at most
+        max_batch_bytes (a single larger message is still
+        sent whole).
+
+        The bulk lane, bulkq, holds BLOBs as iterables of bytes
+        (see IBLOBVector.SetChunks). Each is a complete top
+        level element which is written chunk by chunk so it is
+        never in memory all at once. Control output can not go
+        inside an element, it is written between them, so
+        IDSetBLOB queues each BLOB of a vector separately.
+        """
 
         while self.running:
-            output = await self.outq.get()
+            while self.outq.empty() and self.bulkq.empty():
+                self._output_ready.clear()
+                await self._output_ready.wait()
+
+            if not self.outq.empty():
+                await self._write_control()
+                continue
+
+            output = self.bulkq.get_nowait()
+            if isinstance(output, bytes):
+                await self._write(output)
+            else:
+                for chunk in output:
+                    await self._write(chunk)
+
+    async def _write_control(self):
+
+        batch = []
+        size = 0
+
+        # The control lane only holds bytes, BLOBs and
+        # other chunked output go in the bulk lane.
+        while size < self.max_batch_bytes and not self.outq.empty():
+            output = self.outq.get_nowait()
+            batch.append(output)
+            size += len(output)
+
+        if batch:
+            await self._write(b"".join(batch))
+
+    def _timestamp(self):
+
+        if self.timestamp_output:
+            return self.clock.now()
+
+        return None
+
+    def enable_trace(self, size: int = 256, sample: int = 1):
+        """
+        Keep the last size elements to and from indiserver,
+        one in sample of them, in self.trace. It is logged
+        when a handler raises. Tracing costs nothing while
+        it is off.
+        """
+
+        self.trace = ProtocolTrace(size, sample)
+        return self.trace
+
+    def disable_trace(self):
+        self.trace = None
+
+    def batch(self):
+        """
+        Context manager, sync or async, that collects the
+        control output sent while it is open and queues it
+        as one write when it closes. Sets of the same vector
+        are sent once with its values at that time. If the
+        block raises the sets are not sent and the vectors
+        keep their changed flags, the rest of the output
+        (defs, deletes, messages) is still sent as the
+        property registry has already changed. Batches
+        opened inside a batch join it. Only the output of
+        the task that opened the batch is collected, other
+        tasks keep sending theirs while it is open.
+
+        with dev.batch():
+            dev.IUUpdate(dev.name(), "TEMPS", temps, names, Set=True)
+            dev.IDSet(focus)
+        """
+
+        return OutputBatch(self)
+
+    def _open_batch(self):
+        """The batch open in this task, if there is one."""
+
+        batch = self._batch.get()
+        if batch is None or not batch.open or batch.task is not _current_task():
+            # A task started inside the batch inherits the
+            # context variable but not the batch.
+            return None
+
+        return batch
+
+    def _put_control(self, output: bytes, kind: str = None, keys=(),
+                     replace=False, dropped: Callable = None):
+
+        batch = self._open_batch()
+        if batch is not None:
+            batch.items.append(output)
+        else:
+            self.outq.put_nowait(output, kind, keys, replace, dropped)
+
+    @property
+    def threadsafe(self):
+        """
+        A ThreadSafeDevice to send output from threads
+        other than the event loop's.
+        """
+
+        if self._threadsafe is None:
+            self._threadsafe = ThreadSafeDevice(self)
+
+        return self._threadsafe
+
+    def lane_stats(self):
+        """Queueing delay statistics of each output lane."""
+
+        return {
+            self.outq.name: self.outq.stats(),
+            self.bulkq.name: self.bulkq.stats(),
+        }
+
+    async def _write(self, data: bytes):
+
+        if self.trace is not None:
+            self.trace.add("out", data)
+
+        self.writer.write(data)
+
+        buffered = self.write_buffer_size
+        stats = self.write_stats
+        stats["writes"] += 1
+        stats["bytes"] += len(data)
+        stats["max_buffered"] = max(stats["max_buffered"], buffered)
+        if buffered > self.write_high_water:
+            # indiserver is not keeping up, this is
+            # where we wait instead of blocking the loop.
+            stats["waits"] += 1
+
+        await self.writer.drain()
 
-            logging.debug(output.decode())
-            self.writer.write(output.decode())
-            self.writer.flush()
+    @property
+    def write_buffer_size(self):
+        """Bytes written to stdout that are still buffered."""
+
+        transport = getattr(self.writer, "transport", self.writer)
+        return transport.get_write_buffer_size()
 
     async def run(self):
         """
-        Read stdin and try to parse as xml
+        Read stdin in chunks and feed it to an incremental
+        xml parser. Each completed top level element is
+        handled once.
 
         TODO: Create a real condition for the
         while loop. IT would be nice to be able
         to shutdown gracefully.
         """
 
-        inp = ""
+        parser = XMLStreamParser()
+        self._handler_slots = asyncio.Semaphore(self.max_handlers)
+        self._pending_slots = asyncio.Semaphore(self.max_pending)
         while self.running:
 
-            inp += (await self.reader.readline()).decode()
-            try:
-                # TODO: This should be done with a feed parser
-                xml = etree.fromstring(inp)
-                inp = ""
+            data = await self.reader.read(self.read_width)
+            if not data:
+                logging.warning("stdin closed, no more data from indiserver")
+                self.running = False
+                self.shutdown_offload()
+                break
 
-            except etree.XMLSyntaxError as error:
-                # This is not the best way to check
-                # for completed xml.
-                logging.debug(f"Could not parse xml {error} {inp}")
-                continue
+            for xml in parser.feed(data):
+                await self.handle_xml(xml)
 
-            logging.info("Parsed data from client")
-            logging.info(etree.tostring(xml, pretty_print=True).decode())
-            logging.info("End client data")
+    async def handle_xml(self, xml):
+        """
+        Dispatch a single top level xml element
+        from indiserver.
+        """
 
-            if xml.tag == "getProperties":
+        if self.trace is not None:
+            self.trace.add("in", xml)
 
-                if "device" in xml.attrib:
-                    self.ISGetProperties(xml.attrib['device'])
+        if xml.tag == "getProperties":
 
-                else:
-                    self.ISGetProperties()
+            if "device" in xml.attrib:
+                self.ISGetProperties(xml.attrib['device'])
 
-                self.initProperties()
+            else:
+                self.ISGetProperties()
 
-                # maybe we should run this concurrently
-                # with gather. If it blocks this run loop
-                # it will be difficult to debug.
-                if "device" in xml.attrib:
-                    await self.asyncInitProperties(xml.attrib['device'])
-                else:
-                    await self.asyncInitProperties()
+            self.initProperties()
 
-                if self._once:
-                    # This is where the `repeat` decorated
-                    # functions are called the first time
-                    for reg in self._registrants:
+            # maybe we should run this concurrently
+            # with gather. If it blocks this run loop
+            # it will be difficult to debug.
+            if "device" in xml.attrib:
+                await self.asyncInitProperties(xml.attrib['device'])
+            else:
+                await self.asyncInitProperties()
 
-                        initiate_callback = getattr(self, reg.__name__)
-                        # initiate_callback is actually the 'get_instance'
-                        # function defined in device.repeat.
-                        initiate_callback()
+            if self._once:
+                # This is where the `repeat` decorated
+                # functions are called the first time
+                for reg in self._registrants:
 
-                    self._once = False
+                    initiate_callback = getattr(self, reg.__name__)
+                    # initiate_callback is actually the 'get_instance'
+                    # function defined in device.repeat.
+                    initiate_callback()
 
-            elif xml.attrib['name'] in self._NewPropertyMethods:
-                names = [ele.attrib["name"] for ele in xml]
-                if "Number" in xml.tag:
-                    values = [float(ele.text.strip()) for ele in xml]
-                else:
-                    values = [str(ele.text.strip()) for ele in xml]
+                self._once = False
 
-                self._NewPropertyMethods[xml.attrib['name']](
-                    self,
-                    xml.attrib["device"],
-                    xml.attrib['name'],
-                    values,
-                    names
-                )
+        elif xml.tag == "enableBLOB":
+            self.ISEnableBLOB(
+                xml.attrib.get("device", self._devname),
+                xml.attrib.get("name"),
+                str(xml.text).strip())
 
-            elif xml.tag == "newNumberVector":
+        elif xml.attrib['name'] in self._NewPropertyMethods:
+            handler = functools.partial(
+                self._NewPropertyMethods[xml.attrib['name']], self)
+            if "Number" in xml.tag:
+                await self._dispatch_new(xml, handler, _number_text)
+            else:
+                await self._dispatch_new(xml, handler, _stripped_text)
 
-                try:
-                    names = [ele.attrib["name"] for ele in xml]
-                    values = [float(ele.text.strip()) for ele in xml]
-                    self.ISNewNumber(
-                        xml.attrib["device"],
-                        xml.attrib["name"],
-                        values,
-                        names)
+        elif xml.tag == "newNumberVector":
+            await self._dispatch_new(xml, self.ISNewNumber, _number_text)
 
-                except Exception as error:
-                    logging.debug(f"{error}")
-                    logging.debug(etree.tostring(xml))
-                    raise
+        elif xml.tag == "newTextVector":
+            await self._dispatch_new(xml, self.ISNewText, str)
 
-            elif xml.tag == "newTextVector":
-                try:
-                    names = [ele.attrib["name"] for ele in xml]
-                    values = [str(ele.text) for ele in xml]
-                    self.ISNewText(
-                        xml.attrib["device"],
-                        xml.attrib["name"], values, names)
-                except Exception as error:
-                    logging.debug(f"{error}")
-                    logging.debug(etree.tostring(xml))
-                    raise
+        elif xml.tag == "newSwitchVector":
+            await self._dispatch_new(xml, self.ISNewSwitch, _stripped_text)
 
-            elif xml.tag == "newSwitchVector":
-                try:
-                    names = [ele.attrib["name"] for ele in xml]
-                    # values = [ISState.fromstring(ele.text) for ele in xml]
-                    values = [str(ele.text).strip() for ele in xml]
-                    self.ISNewSwitch(
-                        xml.attrib["device"],
-                        xml.attrib["name"],
-                        values,
-                        names)
-                except Exception as error:
-                    logging.debug(f"{error}")
-                    logging.debug(etree.tostring(xml))
-                    raise
+    async def _dispatch_new(self, xml, handler: Callable, convert: Callable):
+        """
+        Call handler with the device, name, values and names
+        of a new*Vector element. A plain function is called
+        right away. A coroutine is run as a task after the
+        earlier handlers of the same property have finished,
+        so a slow handler only holds up its own property.
+        When max_pending handlers are already running or
+        waiting this waits for one of them to finish.
+        """
+
+        device = xml.attrib.get("device", self._devname)
+        name = xml.attrib["name"]
+
+        try:
+            names = [ele.attrib["name"] for ele in xml]
+            values = [convert(ele.text) for ele in xml]
+
+            if inspect.iscoroutinefunction(handler):
+                start = functools.partial(handler, device, name, values, names)
+
+            else:
+                result = handler(device, name, values, names)
+                if not inspect.isawaitable(result):
+                    return
+
+                def start():
+                    return result
+
+        except Exception as error:
+            logging.debug(etree.tostring(xml))
+            self._handler_failed(device, name, error)
+            return
+
+        if self._handler_slots is None:
+            self._handler_slots = asyncio.Semaphore(self.max_handlers)
+            self._pending_slots = asyncio.Semaphore(self.max_pending)
+
+        await self._pending_slots.acquire()
+
+        key = (device, name)
+        task = self.mainloop.create_task(self._run_handler(
+            self._handler_tails.get(key), device, name, start))
+
+        self._handler_tails[key] = task
+        self.handler_tasks.add(task)
+        task.add_done_callback(functools.partial(self._handler_done, key))
+
+    async def _run_handler(self, previous, device, name, start):
+
+        try:
+            if previous is not None:
+                await asyncio.wait([previous])
+
+            # Only take a slot once it is our turn, a handler
+            # queued behind a slow one must not hold one.
+            async with self._handler_slots:
+                await start()
+
+        except asyncio.CancelledError:
+            raise
+
+        except Exception as error:
+            self._handler_failed(device, name, error)
+
+        finally:
+            self._pending_slots.release()
+
+    def _handler_done(self, key, task):
+
+        self.handler_tasks.discard(task)
+        if self._handler_tails.get(key) is task:
+            del self._handler_tails[key]
+
+    def _handler_failed(self, device: str, name: str, error: Exception):
+        """
+        Log a handler exception and tell the clients. The
+        vector, if there is one, is put in the Alert state.
+        """
+
+        logging.error(f"Handler for {device} {name} failed: {error}")
+        logging.error(traceback.format_exc())
+        if self.trace is not None:
+            logging.error(f"Protocol trace before the failure:\n{self.trace.dump()}")
+
+        msg = f"{name} failed: {error}"
+        vector = self.props.find(name, device)
+        if vector is None or isinstance(vector, IBLOBVector):
+            self.IDMessage(msg, msgtype="ERROR")
+
+        else:
+            vector.state = IPState.ALERT
+            self.IDSet(vector, msg=msg)
 
     def initProperties(self):
         """"""
@@ -1052,18 +2940,27 @@ class device(ABC):
     def IEAddTimer(self, millisecs: int, funct_or_coroutine: Callable, *args):
         """
         create a callback to be executed after a delay.
+        It may be a coroutine function. Returns a handle
+        that can be given to IERmTimer.
 
         If you want to call a method at a regular interval
         use the device.repeat decorator.
         """
 
-        hdl = self.mainloop.call_soon(
-            self.mainloop.call_later,
+        return self.scheduler.call_later(
             millisecs / 1000.0,
             funct_or_coroutine,
             *args)
 
-        self.handles.append(hdl)
+    def IERmTimer(self, handle):
+        """Cancel a timer made by IEAddTimer."""
+
+        handle.cancel()
+
+    def timer_stats(self):
+        """Jitter and runtime stats of each repeat job."""
+
+        return self.scheduler.stats()
 
     async def _debug(self):
         while 1:
@@ -1123,13 +3020,9 @@ class device(ABC):
         if device is None:
             device = self._devname
 
-        for p in self.props:
-            if p.name == name and p.device == device:
-                if group is not None:
-                    if p.group == group:
-                        return p
-                else:
-                    return p
+        prop = self.props.find(name, device, group)
+        if prop is not None:
+            return prop
 
         # We could let this return None but not finding a
         # property seems to be a pretty important issue.
@@ -1147,9 +3040,7 @@ class device(ABC):
         """
 
         vp = self.IUFind(name=name, device=device)
-
-        for nm, val in zip(names, values):
-            vp[nm] = val
+        vp.update(dict(zip(names, values)))
 
         if Set:
             # LEt clients know
@@ -1161,6 +3052,79 @@ class device(ABC):
         raise NotImplementedError(f"Subclass of {self} must implement "
                                   "ISGetProperties")
 
+    def _offload(self, func: Callable, vector: str, *args, **kwargs):
+
+        task = self.mainloop.create_task(
+            self._run_offloaded(func, vector, args, kwargs))
+
+        self.offload_tasks.add(task)
+        task.add_done_callback(self.offload_tasks.discard)
+        return task
+
+    async def _run_offloaded(self, func, vector, args, kwargs):
+
+        if self._offload_slots is None:
+            self._offload_slots = asyncio.Semaphore(self.max_offload)
+
+        async with self._offload_slots:
+            if self._offload_pool is None:
+                self._offload_pool = concurrent.futures.ProcessPoolExecutor(
+                    self.offload_workers)
+
+            try:
+                result = await self.mainloop.run_in_executor(
+                    self._offload_pool,
+                    functools.partial(func, *args, **kwargs))
+
+            except asyncio.CancelledError:
+                raise
+
+            except Exception as error:
+                if vector is None:
+                    raise
+
+                self._handler_failed(self._devname, vector, error)
+                return None
+
+        if vector is not None:
+            self._apply_offloaded(vector, result)
+
+        return result
+
+    def _apply_offloaded(self, name: str, result):
+        """
+        Copy result, a dict of member name to value,
+        into the named vector and send it.
+        """
+
+        vector = self.IUFind(name)
+        if result is not None:
+            for member, value in result.items():
+                vector[member] = value
+
+        if isinstance(vector, IBLOBVector):
+            self.IDSetBLOB(vector)
+        else:
+            self.IDSet(vector)
+
+    def cancel_offload(self):
+        """
+        Cancel the offloaded calls. Calls that are already
+        running in a worker process finish there but their
+        results are dropped.
+        """
+
+        for task in list(self.offload_tasks):
+            task.cancel()
+
+    def shutdown_offload(self, wait: bool = False):
+        """Cancel the offloaded calls and stop the process pool."""
+
+        self.cancel_offload()
+        if self._offload_pool is not None:
+            self._offload_pool.shutdown(wait=wait, cancel_futures=True)
+            self._offload_pool = None
+
     def IDMessage(
         self, msg: str,
         timestamp: Union[str, datetime.datetime, None] = None,
@@ -1173,21 +3137,21 @@ class device(ABC):
         msg : str
             The text of the message
         timestamp : Union[str, datetime.datetime, None], optional
-            timestamp of the message, by default None
+            timestamp of the message in UT, by default None
         msgtype : str, optional
             one of "DEBUG", "INFO", "WARN", by default "INFO"
         """
         if isinstance(timestamp, datetime.datetime):
-            timestamp = timestamp.strftime("%Y-%m-%dT%H:%M:%S")
+            timestamp = iso_timestamp(timestamp)
 
         elif timestamp is None:
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+            timestamp = self.clock.now()
 
         xml = etree.Element("message",
                             attrib={"message": f"[{msgtype}] {msg}",
                                     "timestamp": timestamp,
                                     "device": self.name()})
-        self.outq.put_nowait(etree.tostring(xml))
+        self._put_control(etree.tostring(xml))
         # self.writer.write(xml.encode())
 
     def IDSetNumber(self, n: INumberVector, msg=None):
@@ -1202,15 +3166,251 @@ class device(ABC):
     def IDSetSwitch(self, s: ISwitchVector, msg=None):
         self.IDSet(s, msg)
 
-    def IDSet(self, vector: IVectorProperty, msg=None):
+    def IDSet(self, vector: IVectorProperty, msg=None, mode=None):
+        """
+        Send the current state of vector to the clients. If
+        vector.max_rate is set, updates that come faster than
+        that are coalesced and only the latest state is sent
+        once per 1/max_rate seconds.
+
+        mode is one of SET_MODES and defaults to vector.set_mode.
+        With "changed" or "partial" an update where neither the
+        state nor any member changed (and there is no msg) is
+        not sent and "partial" only sends the changed members.
+        """
+
         if isinstance(vector, IBLOB) or isinstance(vector, IBLOBVector):
             raise RuntimeError("Must use IDSetBLOB to send BLOB to client.")
-        self.outq.put_nowait(etree.tostring(vector.Set(msg), pretty_print=True))
-        # self.writer.write(etree.tostring(vector.Set(msg), pretty_print=True))
 
-    def IDSetBLOB(self, blob):
-        self.outq.put_nowait(etree.tostring(blob.Set()))
-        # self.writer.write(etree.tostring(blob.Set()))
+        if mode is None:
+            mode = vector.set_mode
+
+        if mode not in SET_MODES:
+            raise ValueError(f"IDSet mode must be one of {SET_MODES} not {mode}")
+
+        if vector.max_rate:
+            self._throttled_set(vector, msg, mode)
+        else:
+            self._send_set(vector, msg, mode)
+
+    def _send_set(self, vector: IVectorProperty, msg=None, mode="all"):
+
+        batch = self._open_batch()
+        if batch is not None:
+            batch.add_set(vector, msg, mode)
+            return
+
+        with vector.lock:
+            output = self._serialize_set(vector, msg, mode)
+
+        if output is not None:
+            # A full set without a message replaces a waiting
+            # one of the same vector, a partial one can't. The
+            # changed flags are cleared, if the set is dropped
+            # they are set again so the update is not lost.
+            self._put_control(output, "set", ((vector.device, vector.name),),
+                              mode == "all" and msg is None,
+                              vector.mark_changed)
+
+    def _serialize_set(self, vector: IVectorProperty, msg=None, mode="all"):
+
+        members = None
+        if mode != "all":
+            members = vector.changed_members()
+            if not members and not vector.state_changed and msg is None:
+                # Nothing to tell the clients.
+                return None
+
+            if mode == "changed" or not members:
+                # A set needs at least one member so a
+                # state only change sends all of them.
+                members = None
+
+        if vector.fast_serialize:
+            output = vector.SetBytes(
+                msg, vector.pretty_print, members, self._timestamp())
+        else:
+            output = etree.tostring(
+                vector.Set(msg, members, self._timestamp()),
+                pretty_print=vector.pretty_print)
+
+        vector.clear_changed()
+        return output
+
+    def _throttled_set(self, vector: IVectorProperty, msg=None, mode="all"):
+
+        if self.mainloop is None:
+            # Not started, nothing can time the updates. The
+            # output waits in the queue until then anyway.
+            self._send_set(vector, msg, mode)
+            return
+
+        key = (vector.device, vector.name)
+        throttle = self.throttles.get(key)
+        if throttle is None:
+            throttle = self.throttles[key] = SetThrottle()
+
+        throttle.mode = mode
+        if msg is not None:
+            throttle.msg = msg
+
+        if throttle.handle is not None:
+            # Already scheduled, it will send the latest state.
+            throttle.coalesced += 1
+            return
+
+        due = throttle.last + 1.0 / vector.max_rate
+        if self.mainloop.time() >= due:
+            self._flush_throttle(vector)
+        else:
+            throttle.handle = self.mainloop.call_at(
+                due, self._flush_throttle, vector)
+
+    def _flush_throttle(self, vector: IVectorProperty):
+
+        throttle = self.throttles[(vector.device, vector.name)]
+        msg = throttle.msg
+        throttle.handle = None
+        throttle.msg = None
+        throttle.last = self.mainloop.time()
+        throttle.sent += 1
+        self._send_set(vector, msg, throttle.mode)
+
+    def coalesced_updates(self):
+        """
+        Return the number of coalesced IDSet calls of each
+        rate limited vector keyed by name.
+        """
+
+        return {name: throttle.coalesced
+                for (_, name), throttle in self.throttles.items()}
+
+    def ISEnableBLOB(self, device: str, name: str, mode: str):
+        """
+        Handle the enableBLOB element. name is None when
+        the mode is for all of the device's BLOBs.
+        """
+
+        if mode not in BLOB_MODES:
+            logging.warning(f"enableBLOB must be one of {BLOB_MODES} "
+                            f"not {mode}")
+            return
+
+        if name is None:
+            # The device wide mode replaces the per property ones.
+            for key in [key for key in self.blob_modes if key[0] == device]:
+                del self.blob_modes[key]
+
+        self.blob_modes[(device, name)] = mode
+
+    def blob_mode(self, name: str, device: str = None):
+        """Return the enableBLOB mode of the named BLOB vector."""
+
+        if device is None:
+            device = self._devname
+
+        mode = self.blob_modes.get((device, name))
+        if mode is None:
+            mode = self.blob_modes.get((device, None), self.default_blob_mode)
+
+        return mode
+
+    def wants_blob(self, blob: IBLOBVector):
+        """False if no client wants this BLOB vector."""
+
+        return self.blob_mode(blob.name, blob.device) != "Never"
+
+    def IDSetBLOB(self, blob, msg=None, producer=None):
+        """
+        Send the BLOB vector to the clients. The data is
+        base64 encoded a chunk at a time as it is written
+        so memory use does not grow with the BLOB size.
+
+        If enableBLOB says nobody wants this BLOB this does
+        nothing. producer is an optional callable that fills
+        in the BLOB data, it is called with blob only when
+        the BLOB is going to be sent so the data is never
+        built for nothing. It may be a coroutine function.
+
+        Members with compress_level set are zlib compressed
+        in an executor first, so the event loop is not
+        blocked. In that case, if producer is a coroutine or
+        if an earlier IDSetBLOB of the vector is still being
+        compressed, the task that sends the BLOB is returned,
+        otherwise None. Either way the BLOBs of a vector are
+        queued in the order IDSetBLOB was called.
+        """
+
+        if not self.wants_blob(blob):
+            self.skipped_blobs += 1
+            return None
+
+        produced = None
+        if producer is not None:
+            produced = producer(blob)
+            if not inspect.isawaitable(produced):
+                produced = None
+
+        key = (blob.device, blob.name)
+        previous = self._blob_tails.get(key)
+        if produced is None and previous is None and not any(
+                prop.should_compress() for prop in blob.iprops):
+            self._queue_blob(blob, msg)
+            # self.writer.write(etree.tostring(blob.Set()))
+            return None
+
+        task = self.mainloop.create_task(
+            self._send_blob(previous, produced, blob, msg))
+        self._blob_tails[key] = task
+        task.add_done_callback(functools.partial(self._blob_done, key))
+        return task
+
+    async def _send_blob(self, previous, produced, blob, msg):
+
+        if produced is not None:
+            await produced
+
+        if previous is not None:
+            # Compressing may take longer than the next BLOB
+            # of the vector, which must not be queued first.
+            await asyncio.wait([previous])
+
+        compressed = {}
+        for prop in blob.iprops:
+            if prop.should_compress():
+                compressed[prop.name] = await self.mainloop.run_in_executor(
+                    None,
+                    zlib.compress,
+                    prop.data,
+                    prop.compress_level)
+
+        self._queue_blob(blob, msg, compressed or None)
+
+    def _blob_done(self, key, task):
+
+        if self._blob_tails.get(key) is task:
+            del self._blob_tails[key]
+
+    def _queue_blob(self, blob, msg=None, compressed=None):
+        """
+        Put blob in the bulk lane as one setBLOBVector per
+        member, so control output can be sent in between.
+        """
+
+        timestamp = self._timestamp()
+        if len(blob.iprops) < 2:
+            self.bulkq.put_nowait(blob.SetChunks(
+                msg, compressed=compressed, timestamp=timestamp), "set",
+                ((blob.device, blob.name),), msg is None)
+            return
+
+        for prop in blob.iprops:
+            self.bulkq.put_nowait(blob.SetChunks(
+                msg, compressed=compressed, members=[prop],
+                timestamp=timestamp), "set",
+                ((blob.device, blob.name, prop.name),), msg is None)
+            # Only the first element carries the message.
+            msg = None
 
     def IDDef(self, prop, msg=None):
 
@@ -1222,72 +3422,133 @@ class device(ABC):
             )
 
         if prop not in self.props:
-            self.props.append(prop)
+            self.props.add(prop)
+
         # Send it to the indiserver
-        self.outq.put_nowait((etree.tostring(prop.Def(msg), pretty_print=True)))
+        with prop.lock:
+            output = etree.tostring(
+                prop.Def(msg, self._timestamp()), pretty_print=True)
+            prop.clear_changed()
+
+        self._put_control(output)
+
+    def IDDelete(self, name: str = None, msg: str = None):
+        """
+        Tell the clients to delete the named property, or all
+        of this device's properties if name is None, and
+        remove it from the registry.
+        """
+
+        if name is None:
+            props = [p for p in self.props if p.device == self._devname]
+        else:
+            props = [self.IUFind(name)]
 
-        # self.writer.write((etree.tostring(prop.Def(msg), pretty_print=True)))
+        for prop in props:
+            self.props.remove(prop)
+
+        attrib = {"device": self._devname}
+        if name is not None:
+            attrib["name"] = name
+        timestamp = self._timestamp()
+        if timestamp is not None:
+            attrib["timestamp"] = timestamp
+        if msg is not None:
+            attrib["message"] = msg
+
+        xml = etree.Element("delProperty", attrib=attrib)
+        self._put_control(etree.tostring(xml))
 
     @classmethod
     def NewVectorProperty(cls, name: str):
+        """
+        Decorator for the method that handles new values
+        of the vector property called name. The method is
+        registered with the class it is defined in when
+        that class is created. Stack it to handle several
+        vector properties with one method.
+        """
 
         def get_function(func: Callable):
 
-            cls._NewPropertyMethods[name] = func
+            # A new list, func may share its __dict__ with a
+            # function it wraps.
+            func.new_property_names = [
+                *getattr(func, "new_property_names", ()), name]
             return func
 
         return get_function
 
     @classmethod
-    def repeat(cls, millis: int):
+    def offload(cls, vector: str = None):
+        """
+        Decorator for CPU bound functions that should run in
+        the device's process pool instead of the event loop.
+        The function does not get self, its arguments and
+        return value must pickle and it must be reachable by
+        name, so define it in the class body or at module
+        level. Calling it on a device returns an asyncio task.
+
+        If vector is given, the function returns a dict of
+        member name to value which is applied to that vector
+        and sent with IDSet (IDSetBLOB for BLOBs) on the
+        event loop. An exception puts the vector in Alert.
+
+        @device.offload(vector="blob")
+        def new_fits(nstars):
+            return {"fits_blob": make_fits(nstars)}
+        """
+
+        def get_function(func: Callable):
+
+            return OffloadedFunction(func, vector)
+
+        return get_function
+
+    @classmethod
+    def repeat(cls, millis: int, policy: str = "skip"):
         """This monstrosity is a decorator
         for methods that are to be called
         after the first ISGetProperties is called
-        and then repeated every millis [ms]"""
+        and then repeated every millis [ms].
+
+        The method may be a coroutine function.
+        policy says what happens when a call is
+        still running at the next deadline, see
+        pyindi.scheduler."""
 
         def get_function(func: Callable):
             """"Called during class definition.
             Nested functions hereafter are called
             when func is called.
             """
-            # Register the function with
-            # the class so we know to call
-            # it when in ISGetProperties
-            # is called
-            cls.register(func)
+            # Mark the function so the class
+            # registers it when it is created and
+            # we know to call it when in
+            # ISGetProperties is called
 
+            @functools.wraps(func)
             def get_instance(instance: device):
                 """
-                Set the function to be called with call_later
-                asyncio procedure.
+                Schedule the function on the instance's
+                scheduler. Deadlines are absolute so the
+                period does not drift.
 
                 Called after ISGetProperties is called
                 in device.run
                 """
 
-                @functools.wraps(func)
-                def call_with_error_handling():
-                    """Call the function but make sure
-                    we have error handling with the traceback"""
-
-                    instance.repeat_q.put_nowait(func)
-
-                    # do it again in millis
-                    cl = instance.mainloop.call_later(
-                        millis / 1000.0,
-                        call_with_error_handling)
-                    instance.handles.append(cl)
-                    return
-
-                # The below line calls the wrapped
-                # function for the first time
-                cl = instance.mainloop.call_later(
+                handle = instance.scheduler.every(
                     millis / 1000.0,
-                    call_with_error_handling)
+                    func,
+                    instance,
+                    policy=policy,
+                    name=func.__name__)
 
-                instance.handles.append(cl)
-                return
+                instance.handles.append(handle)
+                return handle
 
+            get_instance.repeat_millis = millis
             return get_instance
 
         return get_function
@@ -1301,7 +3562,11 @@ class device(ABC):
     def vectorFactory(vector_type, attribs, properties):
         """vectorFactory"""
 
-        if 'Number' in vector_type:
+        if 'NumberArray' in vector_type:
+            vec = INumberArrayVector(
+                [INumber(**prop) for prop in properties], **attribs)
+
+        elif 'Number' in vector_type:
             vec = INumberVector([], **attribs)
 
             for prop in properties:
@@ -1360,3 +3625,117 @@ class device(ABC):
                              f"{vector_type}")
 
         return vec
+
+
+class DeviceHost(device):
+    """
+    Run several devices in one driver process. The devices
+    share the host's event loop, stdin/stdout and output
+    queues. Elements from indiserver are routed to the
+    device named by their device attribute, a getProperties
+    without one goes to every device.
+
+    host = DeviceHost([Focuser(name="focus1"), Focuser(name="focus2")])
+    host.start()
+    """
+
+    def __init__(self, devices=(), loop=None, config=None, name=None):
+
+        super().__init__(loop=loop, config=config, name=name)
+        self.devices = {}
+        for dev in devices:
+            self.add(dev)
+
+    def add(self, dev: device):
+        """Host dev. Its output goes through the host's queues."""
+
+        if dev.name() in self.devices:
+            raise ValueError(f"There is already a device named {dev.name()}")
+
+        dev.outq = self.outq
+        dev.bulkq = self.bulkq
+        dev._output_ready = self._output_ready
+        dev.trace = self.trace
+        if self.mainloop is not None:
+            dev.mainloop = self.mainloop
+            dev._attach_loop()
+
+        self.devices[dev.name()] = dev
+
+    def remove(self, name: str, delete: bool = True):
+        """
+        Stop hosting the named device and return it. Its
+        properties are deleted from the clients unless
+        delete is False. Its timers, handlers and offloaded
+        calls are stopped and it gets output queues of its
+        own, so nothing more of it reaches indiserver.
+        """
+
+        dev = self.devices.pop(name)
+        if delete:
+            dev.IDDelete()
+
+        dev.running = False
+        dev.scheduler.cancel_all()
+        dev.shutdown_offload()
+        for task in list(dev.handler_tasks):
+            task.cancel()
+
+        dev._output_ready = asyncio.Event()
+        dev.outq = OutputQueue("control", dev._output_ready, self.outq.maxsize)
+        dev.bulkq = OutputQueue("bulk", dev._output_ready, self.bulkq.maxsize)
+        dev.trace = None
+        return dev
+
+    def ISGetProperties(self, device=None):
+        pass
+
+    def enable_trace(self, size: int = 256, sample: int = 1):
+        """The hosted devices share the host's trace."""
+
+        trace = super().enable_trace(size, sample)
+        for dev in self.devices.values():
+            dev.trace = trace
+
+        return trace
+
+    def disable_trace(self):
+
+        super().disable_trace()
+        for dev in self.devices.values():
+            dev.trace = None
+
+    def shutdown_offload(self, wait: bool = False):
+        """Shut down the process pools of the hosted devices too."""
+
+        super().shutdown_offload(wait)
+        for dev in self.devices.values():
+            dev.shutdown_offload(wait)
+
+    def tasks(self):
+
+        for dev in self.devices.values():
+            dev.mainloop = self.mainloop
+            dev._attach_loop()
+            dev.running = True
+
+        return super().tasks()
+
+    async def handle_xml(self, xml):
+
+        name = xml.attrib.get("device")
+        if name is None:
+            if xml.tag == "getProperties":
+                for dev in list(self.devices.values()):
+                    await dev.handle_xml(xml)
+            else:
+                logging.warning(f"{xml.tag} without a device attribute")
+
+            return
+
+        dev = self.devices.get(name)
+        if dev is None:
+            logging.debug(f"{xml.tag} is for {name} which is not hosted here")
+            return
+
+        await dev.handle_xml(xml)
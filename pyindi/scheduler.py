@@ -0,0 +1,308 @@
+"""
+Timers for pyINDI devices.
+
+Jobs are kept in a heap ordered by their absolute deadline on
+the event loop clock and a single loop timer is armed for the
+earliest one. A repeating job's next deadline is its previous
+deadline plus the period, not the time it ran plus the period,
+so the period does not drift with load.
+
+A repeating job that is still running (a coroutine) when its
+next deadline comes, or whose deadlines were missed because the
+loop was busy, is handled by its overrun policy:
+
+skip: the tick is dropped, the job never overlaps itself.
+queue: the tick runs as soon as the running one finishes, at most
+       one tick waits, any more are dropped like with skip.
+catchup: the tick runs right away, even alongside the running one.
+"""
+
+import asyncio
+import collections
+import functools
+import heapq
+import inspect
+import itertools
+import logging
+import time
+import traceback
+
+
+OVERRUN_POLICIES = ("skip", "queue", "catchup")
+
+_resolution = time.get_clock_info("monotonic").resolution
+
+
+class TimerHandle:
+    """
+    A job scheduled with a Scheduler. Call cancel() to stop
+    it. The rest of the attributes are its timing stats,
+    times are in seconds.
+    """
+
+    __slots__ = (
+        "name",
+        "callback",
+        "args",
+        "deadline",
+        "period",
+        "policy",
+        "_cancelled",
+        "running",
+        "pending",
+        "runs",
+        "skipped",
+        "errors",
+        "last_jitter",
+        "max_jitter",
+        "total_jitter",
+        "max_runtime",
+        "total_runtime",
+    )
+
+    def __init__(self, callback, args, deadline, period=None,
+                 policy="skip", name=None):
+
+        if name is None:
+            name = getattr(callback, "__name__", repr(callback))
+
+        self.name = name
+        self.callback = callback
+        self.args = args
+        self.deadline = deadline
+        self.period = period
+        self.policy = policy
+        self._cancelled = False
+        self.running = 0
+        self.pending = collections.deque()
+        self.runs = 0
+        self.skipped = 0
+        self.errors = 0
+        self.last_jitter = 0.0
+        self.max_jitter = 0.0
+        self.total_jitter = 0.0
+        self.max_runtime = 0.0
+        self.total_runtime = 0.0
+
+    def cancel(self):
+        """Stop the job. A run in progress is not interrupted."""
+
+        self._cancelled = True
+        self.pending.clear()
+
+    def cancelled(self):
+        return self._cancelled
+
+    def stats(self):
+        """The timing stats of this job as a dict."""
+
+        runs = max(self.runs, 1)
+        return {
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "pending": len(self.pending),
+            "last_jitter": self.last_jitter,
+            "max_jitter": self.max_jitter,
+            "mean_jitter": self.total_jitter / runs,
+            "max_runtime": self.max_runtime,
+            "mean_runtime": self.total_runtime / runs,
+        }
+
+    def __repr__(self):
+        return (f"<TimerHandle {self.name} deadline={self.deadline} "
+                f"period={self.period} policy={self.policy}>")
+
+
+class Scheduler:
+    """
+    Run callbacks at absolute times on the event loop.
+    Callbacks may be plain functions or coroutine functions,
+    coroutines are run as tasks so jobs run concurrently.
+    """
+
+    def __init__(self, loop=None):
+
+        self.loop = loop
+        self.repeating = set()
+        self._heap = []
+        self._seq = itertools.count()
+        self._timer = None
+        self._timer_when = None
+        self._tasks = set()
+
+    def _get_loop(self):
+
+        if self.loop is None:
+            self.loop = asyncio.get_event_loop()
+
+        return self.loop
+
+    def time(self):
+        """The current time on the scheduler's clock."""
+
+        return self._get_loop().time()
+
+    def call_at(self, when: float, callback, *args, name=None):
+        """Run callback(*args) once at loop time when."""
+
+        return self._push(TimerHandle(callback, args, when, name=name))
+
+    def call_later(self, delay: float, callback, *args, name=None):
+        """Run callback(*args) once after delay seconds."""
+
+        return self.call_at(self.time() + delay, callback, *args, name=name)
+
+    def every(self, period: float, callback, *args, policy="skip",
+              start=None, name=None):
+        """
+        Run callback(*args) every period seconds. The first
+        run is at loop time start, which defaults to one
+        period from now.
+        """
+
+        if period <= 0:
+            raise ValueError(f"period must be positive not {period}")
+
+        if policy not in OVERRUN_POLICIES:
+            raise ValueError(f"policy must be one of {OVERRUN_POLICIES} "
+                             f"not {policy}")
+
+        if start is None:
+            start = self.time() + period
+
+        handle = TimerHandle(callback, args, start, period, policy, name)
+        self.repeating.add(handle)
+        return self._push(handle)
+
+    def cancel_all(self):
+        """Cancel every job."""
+
+        for _, _, handle in self._heap:
+            handle.cancel()
+
+        self._heap.clear()
+        self.repeating.clear()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def stats(self):
+        """The stats of each repeating job keyed by name."""
+
+        return {handle.name: handle.stats() for handle in self.repeating}
+
+    def __len__(self):
+        return len(self._heap)
+
+    def _push(self, handle: TimerHandle):
+
+        heapq.heappush(self._heap, (handle.deadline, next(self._seq), handle))
+        self._arm()
+        return handle
+
+    def _arm(self):
+
+        if not self._heap:
+            return
+
+        when = self._heap[0][0]
+        if self._timer is not None:
+            if self._timer_when <= when:
+                return
+
+            self._timer.cancel()
+
+        self._timer_when = when
+        self._timer = self._get_loop().call_at(when, self._wake)
+
+    def _wake(self):
+
+        self._timer = None
+        now = self.time() + _resolution
+
+        while self._heap and self._heap[0][0] <= now:
+            deadline, _, handle = heapq.heappop(self._heap)
+            if handle.cancelled():
+                self.repeating.discard(handle)
+                continue
+
+            if handle.period is not None:
+                self._reschedule(handle, now)
+
+            self._fire(handle, deadline)
+
+        self._arm()
+
+    def _reschedule(self, handle: TimerHandle, now: float):
+
+        handle.deadline += handle.period
+        if handle.policy == "skip" and handle.deadline <= now:
+            # Keep the phase, drop the deadlines we missed.
+            missed = int((now - handle.deadline) // handle.period) + 1
+            handle.skipped += missed
+            handle.deadline += missed * handle.period
+
+        heapq.heappush(self._heap, (handle.deadline, next(self._seq), handle))
+
+    def _fire(self, handle: TimerHandle, deadline: float):
+
+        if handle.running and handle.policy != "catchup":
+            if handle.policy == "skip" or handle.pending:
+                handle.skipped += 1
+            else:
+                handle.pending.append(deadline)
+
+            return
+
+        self._run(handle, deadline)
+
+    def _run(self, handle: TimerHandle, deadline: float):
+
+        start = self.time()
+        jitter = start - deadline
+        handle.runs += 1
+        handle.last_jitter = jitter
+        handle.max_jitter = max(handle.max_jitter, jitter)
+        handle.total_jitter += jitter
+
+        try:
+            result = handle.callback(*handle.args)
+
+        except Exception as error:
+            self._failed(handle, error)
+            result = None
+
+        if inspect.isawaitable(result):
+            handle.running += 1
+            task = asyncio.ensure_future(result, loop=self._get_loop())
+            self._tasks.add(task)
+            task.add_done_callback(functools.partial(self._done, handle, start))
+
+        else:
+            self._ran(handle, start)
+
+    def _done(self, handle: TimerHandle, start: float, task: asyncio.Task):
+
+        self._tasks.discard(task)
+        handle.running -= 1
+        self._ran(handle, start)
+
+        if not task.cancelled() and task.exception() is not None:
+            self._failed(handle, task.exception())
+
+        if handle.pending and not handle.running:
+            self._run(handle, handle.pending.popleft())
+
+    def _ran(self, handle: TimerHandle, start: float):
+
+        runtime = self.time() - start
+        handle.max_runtime = max(handle.max_runtime, runtime)
+        handle.total_runtime += runtime
+
+    def _failed(self, handle: TimerHandle, error: Exception):
+
+        handle.errors += 1
+        logging.error(f"There was an exception in the timer job "
+                      f"{handle.name}: {error}")
+        logging.error("".join(traceback.format_exception(error)))
@@ -0,0 +1,45 @@
+import pytest
+
+from pyindi.device import device, INumber, INumberVector, IPState, IPerm
+
+
+class Device(device):
+
+    def ISGetProperties(self, device=None):
+        pass
+
+
+@pytest.fixture
+def make_dev():
+    """Make devices, not started, with the given name."""
+
+    return Device
+
+
+@pytest.fixture
+def dev(make_dev):
+    """A device called dev that is not started."""
+
+    return make_dev(name="dev")
+
+
+@pytest.fixture
+def vector():
+    """An INumberVector NUM of dev with one member a."""
+
+    return INumberVector([INumber("a", "%f", 0, 10, 1, 1.0, label="a")],
+                         "dev", "NUM", IPState.IDLE, IPerm.RW)
+
+
+@pytest.fixture
+def drain():
+    """Take everything queued in the control lane of a device."""
+
+    def drain(dev):
+        output = []
+        while not dev.outq.empty():
+            output.append(dev.outq.get_nowait())
+
+        return output
+
+    return drain
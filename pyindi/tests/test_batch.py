@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from pyindi.device import INumber, INumberVector, IPState, IPerm
+
+
+def test_one_write(dev, vector, drain):
+
+    with dev.batch():
+        dev.IDDef(vector)
+        vector["a"].value = 2
+        dev.IDSet(vector)
+        vector["a"].value = 3
+        dev.IDSet(vector)
+
+    output, = drain(dev)
+    assert output.startswith(b"<defNumberVector")
+    assert output.count(b"<setNumberVector") == 1
+    assert b">3.0<" in output
+
+
+def test_exception_drops_only_sets(dev, vector, drain):
+
+    with pytest.raises(RuntimeError):
+        with dev.batch():
+            dev.IDDef(vector)
+            vector["a"].value = 2
+            dev.IDSet(vector)
+            raise RuntimeError("failed")
+
+    output, = drain(dev)
+    assert output.startswith(b"<defNumberVector")
+    assert b"<setNumberVector" not in output
+    assert vector["a"].changed
+    assert dev.props.find("NUM", "dev") is vector
+
+
+def test_batch_only_holds_its_own_task(dev, vector, drain):
+
+    other = INumberVector([INumber("a", "%f", 0, 10, 1, 1.0, label="a")],
+                          "dev", "OTHER", IPState.IDLE, IPerm.RW)
+
+    async def update_other():
+        other["a"].value = 5
+        dev.IDSet(other)
+        dev.IDMessage("urgent")
+
+    async def batched():
+        async with dev.batch():
+            vector["a"].value = 2
+            dev.IDSet(vector)
+            await asyncio.sleep(0.01)
+            raise RuntimeError("failed")
+
+    async def main():
+        results = await asyncio.gather(
+            batched(), update_other(), return_exceptions=True)
+        return results
+
+    failed, _ = asyncio.run(main())
+    assert isinstance(failed, RuntimeError)
+
+    output = drain(dev)
+    assert len(output) == 2
+    assert b'name="OTHER"' in output[0] and b">5.0<" in output[0]
+    assert b"urgent" in output[1]
+    assert vector["a"].changed
+
+
+def test_task_started_in_batch_is_not_held(dev, vector, drain):
+
+    async def main():
+        async with dev.batch():
+            dev.IDMessage("batched")
+            child = asyncio.create_task(update())
+            await child
+            queued = len(drain(dev))
+
+        return queued
+
+    async def update():
+        dev.IDSet(vector)
+
+    assert asyncio.run(main()) == 1
+    output, = drain(dev)
+    assert b"batched" in output
@@ -0,0 +1,44 @@
+import asyncio
+import base64
+import time
+import zlib
+
+from lxml import etree
+
+from pyindi.device import IBLOB, IBLOBVector, IPState, IPerm
+
+
+def test_compressed_blobs_keep_their_order(dev, monkeypatch):
+
+    compress = zlib.compress
+
+    def slow_first(data, level):
+        if data.startswith(b"first"):
+            time.sleep(0.1)
+        return compress(data, level)
+
+    monkeypatch.setattr(zlib, "compress", slow_first)
+    blob = IBLOB("image", ".fits")
+    blob.compress_level = 1
+    vector = IBLOBVector([blob], "dev", "IMAGE", IPState.OK, IPerm.RO)
+
+    async def main():
+        dev.mainloop = asyncio.get_running_loop()
+        blob.data = b"first" * 1000
+        first = dev.IDSetBLOB(vector)
+        # Let the first one start compressing.
+        await asyncio.sleep(0.01)
+        blob.data = b"second" * 1000
+        second = dev.IDSetBLOB(vector)
+        await asyncio.wait_for(asyncio.gather(first, second), 5)
+
+    asyncio.run(main())
+    sent = []
+    while not dev.bulkq.empty():
+        element = etree.fromstring(b"".join(dev.bulkq.get_nowait()))
+        sent.append(zlib.decompress(base64.b64decode(element[0].text)))
+
+    # The newest frame is the one left, the slow first one
+    # must not replace it.
+    assert sent == [b"second" * 1000]
+    assert dev._blob_tails == {}
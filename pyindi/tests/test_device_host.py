@@ -0,0 +1,39 @@
+import asyncio
+
+from pyindi.device import DeviceHost
+
+
+def test_remove(make_dev, vector, drain):
+
+    async def main():
+        host = DeviceHost([make_dev(name="dev"), make_dev(name="other")],
+                          loop=asyncio.get_running_loop())
+
+        dev = host.devices["dev"]
+        dev.IDDef(vector)
+        ticks = []
+        dev.scheduler.every(0.01, ticks.append, 1)
+        drain(host)
+
+        assert host.remove("dev") is dev
+        output, = drain(host)
+        assert output.startswith(b'<delProperty device="dev"')
+        assert len(dev.scheduler) == 0
+
+        await asyncio.sleep(0.03)
+        dev.IDMessage("gone")
+        assert ticks == []
+        assert drain(host) == []
+        assert "dev" not in host.devices
+
+    asyncio.run(main())
+
+
+def test_shutdown_offload_reaches_hosted_devices(make_dev, monkeypatch):
+
+    host = DeviceHost([make_dev(name="dev")])
+    calls = []
+    monkeypatch.setattr(host.devices["dev"], "shutdown_offload", calls.append)
+
+    host.shutdown_offload()
+    assert calls == [False]
@@ -0,0 +1,96 @@
+import asyncio
+
+from lxml import etree
+
+from pyindi.device import device
+
+
+class SlowDevice(device):
+
+    def __init__(self):
+        super().__init__(name="dev")
+        self.release = asyncio.Event()
+        self.done = []
+
+    def ISGetProperties(self, device=None):
+        pass
+
+    async def ISNewNumber(self, device, name, values, names):
+        if name == "SLOW":
+            await self.release.wait()
+
+        self.done.append((name, values[0]))
+
+
+def new_number(name, value):
+
+    return etree.fromstring(
+        f'<newNumberVector device="dev" name="{name}">'
+        f'<oneNumber name="a">{value}</oneNumber>'
+        f'</newNumberVector>')
+
+
+def test_busy_property_does_not_block_others():
+
+    async def main():
+        dev = SlowDevice()
+        dev.mainloop = asyncio.get_running_loop()
+        dev.max_handlers = 2
+        for i in range(10):
+            await dev.handle_xml(new_number("SLOW", i))
+
+        await asyncio.wait_for(dev.handle_xml(new_number("FAST", 1)), 1)
+        await asyncio.sleep(0.01)
+        assert dev.done == [("FAST", 1.0)]
+
+        dev.release.set()
+        await asyncio.wait_for(asyncio.gather(*dev.handler_tasks), 1)
+        return dev.done
+
+    done = asyncio.run(main())
+    assert done[1:] == [("SLOW", float(i)) for i in range(10)]
+
+
+def test_pending_handlers_bound_the_reader():
+
+    async def main():
+        dev = SlowDevice()
+        dev.mainloop = asyncio.get_running_loop()
+        dev.max_pending = 3
+        for i in range(3):
+            await dev.handle_xml(new_number("SLOW", i))
+
+        blocked = asyncio.ensure_future(dev.handle_xml(new_number("SLOW", 3)))
+        await asyncio.sleep(0.01)
+        assert not blocked.done()
+
+        dev.release.set()
+        await asyncio.wait_for(blocked, 1)
+        await asyncio.wait_for(asyncio.gather(*dev.handler_tasks), 1)
+        return dev.done
+
+    assert len(asyncio.run(main())) == 4
+
+
+class StackedDevice(device):
+
+    def ISGetProperties(self, device=None):
+        pass
+
+    @device.NewVectorProperty("FIRST")
+    @device.NewVectorProperty("SECOND")
+    def new_either(self, device, name, values, names):
+        self.done.append(name)
+
+
+def test_stacked_new_vector_property():
+
+    async def main():
+        dev = StackedDevice(name="dev")
+        dev.done = []
+        await dev.handle_xml(new_number("FIRST", 1))
+        await dev.handle_xml(new_number("SECOND", 2))
+        return dev.done
+
+    assert set(StackedDevice._NewPropertyMethods) >= {"FIRST", "SECOND"}
+    assert asyncio.run(main()) == ["FIRST", "SECOND"]
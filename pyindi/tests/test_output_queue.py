@@ -0,0 +1,156 @@
+import asyncio
+
+import pytest
+
+from pyindi.device import OutputQueue, INumber, INumberVector, IPState, IPerm
+
+
+def drain(queue):
+
+    items = []
+    while not queue.empty():
+        items.append(queue.get_nowait())
+
+    return items
+
+
+def test_fifo():
+
+    queue = OutputQueue("test")
+    for item in (b"a", b"b", b"c"):
+        queue.put_nowait(item)
+
+    assert queue.qsize() == 3
+    assert drain(queue) == [b"a", b"b", b"c"]
+    with pytest.raises(asyncio.QueueEmpty):
+        queue.get_nowait()
+
+
+def test_replace_in_place():
+
+    queue = OutputQueue("test")
+    queue.put_nowait(b"x1", "set", (("dev", "x"),), True)
+    queue.put_nowait(b"def", None)
+    queue.put_nowait(b"x2", "set", (("dev", "x"),), True)
+
+    assert drain(queue) == [b"x2", b"def"]
+    assert queue.stats()["coalesced"] == 1
+
+
+def test_replace_behind_newer_set():
+
+    queue = OutputQueue("test")
+    key = ("dev", "x")
+    queue.put_nowait(b"x1", "set", (key,), True)
+    queue.put_nowait(b"x2 msg", "set", (key,))
+    queue.put_nowait(b"x3", "set", (key,), True)
+
+    # x3 must not jump ahead of x2, x1 is dropped instead.
+    assert drain(queue) == [b"x2 msg", b"x3"]
+    assert queue.stats()["coalesced"] == 1
+
+
+def test_replace_behind_batch():
+
+    queue = OutputQueue("test")
+    queue.put_nowait(b"x1", "set", (("dev", "x"),), True)
+    queue.put_nowait(b"x2 y1", "set", (("dev", "x"), ("dev", "y")))
+    queue.put_nowait(b"x3", "set", (("dev", "x"),), True)
+
+    assert drain(queue) == [b"x2 y1", b"x3"]
+
+
+def test_replace_after_sent():
+
+    queue = OutputQueue("test")
+    key = ("dev", "x")
+    queue.put_nowait(b"x1", "set", (key,), True)
+    assert queue.get_nowait() == b"x1"
+    queue.put_nowait(b"x2", "set", (key,), True)
+
+    assert drain(queue) == [b"x2"]
+    assert queue.stats()["coalesced"] == 0
+
+
+def test_drop_oldest_set():
+
+    queue = OutputQueue("test", maxsize=2)
+    queue.put_nowait(b"set1", "set")
+    queue.put_nowait(b"def", None)
+    queue.put_nowait(b"set2", "set")
+    queue.put_nowait(b"message", None)
+
+    assert drain(queue) == [b"def", b"message"]
+    assert queue.stats()["dropped"] == 2
+
+
+def test_full_of_control_output():
+
+    queue = OutputQueue("test", maxsize=1)
+    queue.put_nowait(b"def1", None)
+    queue.put_nowait(b"set", "set")
+    queue.put_nowait(b"def2", None)
+
+    # Control output is never dropped, even past maxsize.
+    assert drain(queue) == [b"def1", b"def2"]
+    assert queue.stats()["high_water"] == 2
+
+
+def test_dead_entries_are_compacted():
+
+    queue = OutputQueue("test", maxsize=10)
+    for i in range(1000):
+        queue.put_nowait(b"%d" % i, "set")
+
+    assert queue.stats()["dropped"] == 990
+    assert len(queue._items) < 100
+    assert drain(queue) == [b"%d" % i for i in range(990, 1000)]
+
+
+def test_get_waits_for_put():
+
+    async def main():
+        queue = OutputQueue("test")
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.01, queue.put_nowait, b"late")
+        return await asyncio.wait_for(queue.get(), 1)
+
+    assert asyncio.run(main()) == b"late"
+
+
+def test_dropped_callback():
+
+    queue = OutputQueue("test", maxsize=1)
+    dropped = []
+    queue.put_nowait(b"set1", "set", dropped=lambda: dropped.append(1))
+    queue.put_nowait(b"set2", "set", dropped=lambda: dropped.append(2))
+    queue.put_nowait(b"def", None)
+    queue.put_nowait(b"set3", "set", dropped=lambda: dropped.append(3))
+
+    assert dropped == [1, 2, 3]
+    assert drain(queue) == [b"def"]
+
+
+def test_dropped_partial_set_is_sent_again(dev, drain):
+
+    vector = INumberVector(
+        [INumber(name, "%f", 0, 10, 1, 1.0) for name in ("a", "b")],
+        "dev", "NUM", IPState.IDLE, IPerm.RW)
+    dev.outq.maxsize = 1
+
+    vector["a"].value = 2
+    dev.IDSet(vector, mode="partial")
+    assert not vector.changed
+
+    # The partial set of a is dropped to make room for this one.
+    other = INumberVector([INumber("c", "%f", 0, 10, 1, 1.0)],
+                          "dev", "OTHER", IPState.IDLE, IPerm.RW)
+    dev.IDSet(other)
+    assert vector.changed
+    drain(dev)
+
+    vector["b"].value = 3
+    dev.IDSet(vector, mode="partial")
+    output, = drain(dev)
+    assert b'<oneNumber name="a">2.0' in output
+    assert b'<oneNumber name="b">3.0' in output
@@ -0,0 +1,144 @@
+import asyncio
+
+import pytest
+
+from pyindi.scheduler import Scheduler
+
+
+PERIOD = 0.02
+
+
+def run(main):
+    return asyncio.run(asyncio.wait_for(main(), 5))
+
+
+def test_call_later():
+
+    async def main():
+        scheduler = Scheduler()
+        calls = []
+        scheduler.call_later(PERIOD, calls.append, "once")
+        await asyncio.sleep(4 * PERIOD)
+        return calls
+
+    assert run(main) == ["once"]
+
+
+def test_every_keeps_its_phase():
+
+    async def main():
+        scheduler = Scheduler()
+        start = scheduler.time() + PERIOD
+        handle = scheduler.every(PERIOD, lambda: None, start=start)
+        await asyncio.sleep(5.5 * PERIOD)
+        handle.cancel()
+        return start, handle
+
+    start, handle = run(main)
+    assert handle.runs >= 3
+    # Deadlines stay on the start + n * period grid.
+    steps = (handle.deadline - start) / PERIOD
+    assert steps == pytest.approx(round(steps))
+
+
+def test_cancel():
+
+    async def main():
+        scheduler = Scheduler()
+        calls = []
+        handle = scheduler.every(PERIOD, calls.append, 1)
+        await asyncio.sleep(2.5 * PERIOD)
+        handle.cancel()
+        runs = len(calls)
+        await asyncio.sleep(3 * PERIOD)
+        return runs, len(calls), len(scheduler)
+
+    runs, after, waiting = run(main)
+    assert runs >= 1
+    assert after == runs
+    assert waiting == 0
+
+
+def test_bad_arguments():
+
+    scheduler = Scheduler(loop=asyncio.new_event_loop())
+    with pytest.raises(ValueError):
+        scheduler.every(0, print)
+    with pytest.raises(ValueError):
+        scheduler.every(1, print, policy="later")
+    scheduler.loop.close()
+
+
+def slow_job(policy):
+    """
+    Run a job that takes 3.5 periods for about 10 periods,
+    return its handle and the most runs that overlapped.
+    """
+
+    async def main():
+        scheduler = Scheduler()
+        overlap = [0, 0]
+
+        async def job():
+            overlap[0] += 1
+            overlap[1] = max(overlap)
+            await asyncio.sleep(3.5 * PERIOD)
+            overlap[0] -= 1
+
+        handle = scheduler.every(PERIOD, job, policy=policy)
+        await asyncio.sleep(10.5 * PERIOD)
+        pending = len(handle.pending)
+        handle.cancel()
+        await asyncio.sleep(4 * PERIOD)
+        return handle, overlap[1], pending
+
+    return run(main)
+
+
+def test_skip():
+
+    handle, overlap, pending = slow_job("skip")
+    assert overlap == 1
+    assert pending == 0
+    assert handle.skipped > 0
+    assert handle.runs + handle.skipped >= 9
+
+
+def test_queue_holds_one_tick():
+
+    handle, overlap, pending = slow_job("queue")
+    assert overlap == 1
+    assert pending <= 1
+    assert handle.skipped > 0
+    # Back to back runs, each queued right when the last ended.
+    assert handle.runs >= 3
+
+
+def test_catchup_overlaps():
+
+    handle, overlap, pending = slow_job("catchup")
+    assert overlap > 1
+    assert handle.skipped == 0
+
+
+def test_errors_are_counted():
+
+    async def main():
+        scheduler = Scheduler()
+
+        def fail():
+            raise RuntimeError("job failed")
+
+        async def afail():
+            raise RuntimeError("job failed")
+
+        handle = scheduler.every(PERIOD, fail)
+        ahandle = scheduler.every(PERIOD, afail)
+        await asyncio.sleep(2.5 * PERIOD)
+        scheduler.cancel_all()
+        return handle, ahandle
+
+    handle, ahandle = run(main)
+    assert handle.errors == handle.runs > 0
+    assert ahandle.errors == ahandle.runs > 0
+    assert set(handle.stats()) >= {"runs", "skipped", "errors", "max_jitter"}
@@ -0,0 +1,132 @@
+import base64
+
+import pytest
+from lxml import etree
+
+from pyindi.device import (
+    INumber, INumberVector, IText, ITextVector, ISwitch, ISwitchVector,
+    ILight, ILightVector, IBLOB, IBLOBVector, ISState, ISRule, IPState,
+    IPerm, INumberArrayVector
+)
+
+
+TEXTS = [
+    "plain",
+    "<less> & \"more\" 'quoted'",
+    "café °C ℃ \U0001f52d",
+]
+
+
+def number_vector(text):
+    return INumberVector(
+        [INumber("a", "%.3f", 0, 10, 0.5, 1.25, label=text),
+         INumber("b", "%g", -1e9, 1e9, 0, -3e7)],
+        "dev", "NUMBER", IPState.OK, IPerm.RW, label=text)
+
+
+def text_vector(text):
+    return ITextVector(
+        [IText("a", text), IText("b", "")],
+        "dev", "TEXT", IPState.BUSY, IPerm.RO, group=text)
+
+
+def switch_vector(text):
+    return ISwitchVector(
+        [ISwitch("a", ISState.ON, label=text), ISwitch("b", ISState.OFF)],
+        "dev", "SWITCH", IPState.IDLE, ISRule.ONEOFMANY, IPerm.RW)
+
+
+def light_vector(text):
+    return ILightVector(
+        [ILight("a", IPState.ALERT, label=text), ILight("b", IPState.OK)],
+        "dev", "LIGHT", IPState.ALERT, label=text)
+
+
+def number_array_vector(text):
+    pytest.importorskip("numpy")
+    return INumberArrayVector(
+        [INumber("a", "%.3f", 0, 10, 0.5, 1.25, label=text),
+         INumber("b", "%g", -1e9, 1e9, 0, -3e7)],
+        "dev", "ARRAY", IPState.OK, IPerm.RW)
+
+
+VECTORS = [number_vector, text_vector, switch_vector, light_vector,
+           number_array_vector]
+
+
+@pytest.mark.parametrize("make_vector", VECTORS)
+@pytest.mark.parametrize("text", TEXTS)
+@pytest.mark.parametrize("msg", [None, "done", *TEXTS])
+@pytest.mark.parametrize("pretty_print", [True, False])
+def test_set_bytes_matches_lxml(make_vector, text, msg, pretty_print):
+
+    vector = make_vector(text)
+    timestamp = "2024-01-02T03:04:05.678"
+    expected = etree.tostring(vector.Set(msg, timestamp=timestamp),
+                              pretty_print=pretty_print)
+
+    assert vector.SetBytes(msg, pretty_print, timestamp=timestamp) == expected
+    assert vector.SetString(msg, pretty_print).encode(
+        "ascii", "xmlcharrefreplace") == etree.tostring(
+            vector.Set(msg), pretty_print=pretty_print)
+
+
+@pytest.mark.parametrize("pretty_print", [True, False])
+def test_set_bytes_members(pretty_print):
+
+    vector = number_vector("label")
+    members = [vector["b"]]
+    expected = etree.tostring(vector.Set(members=members),
+                              pretty_print=pretty_print)
+
+    assert vector.SetBytes(None, pretty_print, members) == expected
+
+
+def blob_vector(*sizes):
+
+    blobs = []
+    for i, size in enumerate(sizes):
+        blob = IBLOB(f"b{i}", ".fits")
+        if size is not None:
+            blob.data = bytes(range(256)) * (size // 256) + bytes(size % 256)
+        blobs.append(blob)
+
+    return IBLOBVector(blobs, "dev", "BLOB", IPState.OK, IPerm.RO)
+
+
+@pytest.mark.parametrize("sizes", [(0,), (1,), (56, 57, 58), (200000,),
+                                   (None, 3)])
+@pytest.mark.parametrize("chunk_size", [57, 57 * 1024])
+@pytest.mark.parametrize("msg", [None, "café <&>"])
+def test_set_chunks_matches_lxml(sizes, chunk_size, msg):
+
+    vector = blob_vector(*sizes)
+    expected = etree.tostring(vector.Set(msg))
+    chunks = list(vector.SetChunks(msg, chunk_size))
+
+    assert b"".join(chunks) == expected
+    if sum(filter(None, sizes)) > chunk_size:
+        # The data really was split up.
+        assert len(chunks) > 2 + 2 * len(sizes)
+
+
+def test_set_chunks_compressed():
+
+    vector = blob_vector(10)
+    chunks = vector.SetChunks(compressed={"b0": b"zipped"})
+    element = etree.fromstring(b"".join(chunks))
+
+    blob, = element
+    assert blob.attrib["format"] == ".fits.z"
+    assert blob.attrib["size"] == "10"
+    assert base64.b64decode(blob.text) == b"zipped"
+
+
+def test_set_chunks_takes_data_when_called():
+
+    vector = blob_vector(10)
+    chunks = vector.SetChunks()
+    vector["b0"].data = b"replaced"
+
+    blob, = etree.fromstring(b"".join(chunks))
+    assert base64.b64decode(blob.text) == blob_vector(10)["b0"].data
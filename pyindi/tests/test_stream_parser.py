@@ -0,0 +1,94 @@
+import pytest
+
+from pyindi.device import XMLStreamParser
+
+
+STREAM = (
+    b'<getProperties version="1.7"/>\n'
+    b'<newNumberVector device="dev" name="N">'
+    b'<oneNumber name="a">1.5</oneNumber></newNumberVector>'
+    b'<newTextVector device="dev" name="T">'
+    b'<oneText name="a">caf\xc3\xa9 &lt;&amp;&gt;</oneText></newTextVector>'
+)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, len(STREAM)])
+def test_stream_parser(chunk_size):
+
+    parser = XMLStreamParser()
+    elements = []
+    for start in range(0, len(STREAM), chunk_size):
+        elements.extend(parser.feed(STREAM[start:start + chunk_size]))
+
+    assert [ele.tag for ele in elements] == [
+        "getProperties", "newNumberVector", "newTextVector"]
+    assert elements[1][0].text == "1.5"
+    assert elements[2][0].text == "café <&>"
+    # Completed elements are detached so the tree doesn't grow.
+    assert all(ele.getparent() is None for ele in elements)
+
+
+def test_stream_parser_reset():
+
+    parser = XMLStreamParser()
+    elements = parser.feed(b'<getProperties version="1.7"/><newText')
+    assert [ele.tag for ele in elements] == ["getProperties"]
+
+    # Drop the partial element.
+    parser.reset()
+    elements = parser.feed(b'<getProperties version="1.7"/>')
+    assert [ele.tag for ele in elements] == ["getProperties"]
+
+
+def tags(elements):
+    return [ele.tag for ele in elements]
+
+
+def test_stream_parser_error_keeps_completed():
+
+    parser = XMLStreamParser()
+    elements = parser.feed(
+        b'<getProperties version="1.7"/>'
+        b'<newTextVector device="dev" name="T"></oneText>'
+        b'<enableBLOB device="dev">Also</enableBLOB>')
+
+    # The elements before and after the bad one survive.
+    assert tags(elements) == ["getProperties", "enableBLOB"]
+    assert parser.errors == 1
+
+
+def test_stream_parser_error_in_earlier_chunk():
+
+    parser = XMLStreamParser()
+    assert parser.feed(b'<newTextVector device="dev" name="T"><one') == []
+    elements = parser.feed(
+        b'Text name="a">x</oneTex></newTextVector>'
+        b'<getProperties version="1.7"/>')
+
+    assert tags(elements) == ["getProperties"]
+
+
+def test_stream_parser_resyncs_across_chunks():
+
+    parser = XMLStreamParser()
+    assert parser.feed(b'<newTextVector device="dev" name="T"></x><oneText'
+                       b' name="a">lost</oneText></newTextVector><getPro') == []
+    assert parser.resync
+    elements = parser.feed(
+        b'perties version="1.7"/><enableBLOB device="dev">Never</enableBLOB>')
+
+    assert tags(elements) == ["getProperties", "enableBLOB"]
+    assert not parser.resync
+
+
+def test_stream_parser_bad_start_tag():
+
+    parser = XMLStreamParser()
+    elements = parser.feed(
+        b'<newNumberVector device=dev><oneNumber name="a">1</oneNumber>'
+        b'</newNumberVector><newNumberVector device="dev" name="N">'
+        b'<oneNumber name="a">2</oneNumber></newNumberVector>')
+
+    # The members of the bad element are not taken for elements.
+    assert tags(elements) == ["newNumberVector"]
+    assert elements[0][0].text == "2"
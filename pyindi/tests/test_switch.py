@@ -0,0 +1,46 @@
+from pyindi.device import ISwitch, ISwitchVector, ISState, ISRule, IPState, IPerm
+
+
+def one_of_many(*states):
+
+    switches = [ISwitch(f"s{i}", state) for i, state in enumerate(states)]
+    return ISwitchVector(switches, "dev", "SWITCH", IPState.IDLE,
+                         ISRule.ONEOFMANY, IPerm.RW)
+
+
+def on(vector):
+    return [switch.name for switch in vector.sp if ISState.ON == switch.value]
+
+
+def test_one_of_many():
+
+    vector = one_of_many(ISState.ON, ISState.OFF, ISState.OFF)
+    vector["s2"] = "On"
+    assert on(vector) == ["s2"]
+
+
+def test_switch_set_directly():
+
+    vector = one_of_many(ISState.OFF, ISState.OFF, ISState.OFF)
+    vector["s0"] = "On"
+    vector["s1"].value = ISState.ON
+    vector["s2"] = "On"
+    assert on(vector) == ["s2"]
+
+
+def test_switch_added_later():
+
+    vector = one_of_many(ISState.ON, ISState.OFF)
+    vector.sp.append(ISwitch("s2", ISState.OFF))
+    vector["s2"].value = "On"
+    vector["s1"] = "On"
+    assert on(vector) == ["s1"]
+
+
+def test_switch_removed():
+
+    vector = one_of_many(ISState.ON, ISState.OFF, ISState.OFF)
+    vector.sp.pop(0)
+    vector["s2"].value = "On"
+    vector["s1"] = "On"
+    assert on(vector) == ["s1"]
@@ -0,0 +1,48 @@
+import asyncio
+import threading
+
+
+def test_calls_before_start_wait_for_the_loop(dev, vector, drain):
+
+    vector.max_rate = 10
+
+    # Neither may touch mainloop, which does not exist yet.
+    thread = threading.Thread(target=dev.threadsafe.IDMessage, args=("early",))
+    thread.start()
+    thread.join()
+    dev.IDSet(vector)
+    assert dev.outq.qsize() == 1
+
+    async def main():
+        dev.mainloop = asyncio.get_running_loop()
+        dev._attach_loop()
+        await asyncio.sleep(dev.threadsafe.interval + 0.05)
+
+    asyncio.run(main())
+    output = drain(dev)
+    assert len(output) == 2
+    assert b"early" in output[1]
+    assert dev.threadsafe.batches == 1
+
+
+def test_calls_from_threads_are_batched(dev, vector):
+
+    async def main():
+        dev.mainloop = asyncio.get_running_loop()
+        dev._attach_loop()
+
+        def update():
+            for i in range(100):
+                with vector.lock:
+                    vector["a"].value = i
+                dev.threadsafe.IDSet(vector)
+
+        thread = threading.Thread(target=update)
+        thread.start()
+        await asyncio.to_thread(thread.join)
+        await asyncio.sleep(dev.threadsafe.interval + 0.05)
+
+    asyncio.run(main())
+    assert dev.threadsafe.calls + dev.threadsafe.deduped == 100
+    assert dev.threadsafe.batches < 100
+    assert b">99.0<" in dev.outq.get_nowait()
@@ -9,6 +9,7 @@ from xml.sax.expatreader import ExpatParser
 import logging
 from io import StringIO, BytesIO
 from base64 import b64decode
+import zlib
 
 """
     This module contains classes and methods to build an INDI
@@ -216,6 +217,13 @@ class BlobHandler(ContentHandler):
                 
                 # Convert to raw binary. 
                 bindata = b64decode(self.current_blob.read())
+
+                # INDI ".z" formats are zlib compressed,
+                # hand the handler the original data.
+                fmt = self.attr.get("format", "")
+                if fmt.endswith(".z"):
+                    bindata = zlib.decompress(bindata)
+                    self.attr["format"] = fmt[:-2]
                 
                 self.indiclient.put_blob(bindata, **self.attr)
 